@@ -1,6 +1,6 @@
 from django.contrib import admin, messages
-from django.core.mail import send_mail
-from .models import User, Car, Booking
+from . import owners, transitions
+from .models import User, Car, Booking, OutboundEmail, ProcessedStripeEvent
 
 
 @admin.register(User)
@@ -16,51 +16,31 @@ class UserAdmin(admin.ModelAdmin):
         ("Permissions", {"fields": ("role", "is_active", "is_approved")}),
     )
 
+    @admin.action(description="Approve selected owners")
     def approve_selected_owners(self, request, queryset):
-        """Admin bulk action: Approve multiple owners."""
-        owners = queryset.filter(role="owner", is_approved=False)
-        if not owners.exists():
+        """Admin bulk action: Approve multiple owners, one UPDATE per chunk."""
+        approved = selected = chunks = 0
+        for approved, selected in owners.approve(queryset):
+            chunks += 1
+        if not selected:
             self.message_user(request, "No pending owners found.", level=messages.WARNING)
             return
 
-        count = 0
-        for owner in owners:
-            owner.is_approved = True
-            owner.is_active = True
-            owner.save()
-            count += 1
-
-            try:
-                send_mail(
-                    subject="✅ Account Approved",
-                    message=(
-                        f"Hello {owner.username},\n\n"
-                        "Your owner account has been approved by the admin.\n"
-                        "You can now log in and start adding your cars.\n\n"
-                        "Best regards,\nRoyal Cars Team"
-                    ),
-                    from_email=None,
-                    recipient_list=[owner.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                self.message_user(
-                    request, f"⚠️ Email not sent to {owner.email}: {e}", level=messages.WARNING
-                )
-
         self.message_user(
             request,
-            f"✅ {count} owner account(s) approved successfully.",
+            f"✅ {approved} owner account(s) approved successfully in {chunks} batch(es); emails queued.",
             level=messages.SUCCESS,
         )
-
-    approve_selected_owners.short_description = "Approve selected owners"
+        if approved < selected:
+            self.message_user(
+                request, f"{selected - approved} owner(s) were already approved meanwhile.", level=messages.WARNING
+            )
 
 
 @admin.register(Car)
 class CarAdmin(admin.ModelAdmin):
-    list_display = ("name", "owner", "year", "transmission", "price", "mileage")
-    list_filter = ("year", "transmission")
+    list_display = ("name", "owner", "year", "transmission", "price", "mileage", "mileage_km", "image_status")
+    list_filter = ("year", "transmission", "image_status")
     search_fields = ("name", "year", "owner__username")
     ordering = ("-year", "name")
 
@@ -74,58 +54,54 @@ class BookingAdmin(admin.ModelAdmin):
         "drop_location",
         "pickup_date",
         "pickup_time",
+        "days",
+        "total_price",
         "status",
     )
     list_filter = ("status", "pickup_date")
     search_fields = ("user__username", "car__name")
     ordering = ("-pickup_date",)
 
+    actions = ("approve_selected", "reject_selected")
+
     def save_model(self, request, obj, form, change):
         """Detect status changes and send appropriate email notifications."""
-        if change:
-            old_obj = Booking.objects.get(pk=obj.pk)
-            if old_obj.status != obj.status:
-                subject, message = None, None
-
-                if obj.status == "approved":
-                    subject = "✅ Booking Approved"
-                    message = (
-                        f"Hello {obj.user.username},\n\n"
-                        f"Your booking has been approved!\n\n"
-                        f"Car: {obj.car.name}\n"
-                        f"Pickup: {obj.pickup_location}\n"
-                        f"Drop: {obj.drop_location}\n"
-                        f"Date: {obj.pickup_date}\n"
-                        f"Time: {obj.pickup_time}\n\n"
-                        "Thank you for choosing Royal Cars!"
-                    )
-
-                elif obj.status == "rejected":
-                    subject = "❌ Booking Rejected"
-                    message = (
-                        f"Hello {obj.user.username},\n\n"
-                        f"Unfortunately, your booking has been rejected.\n\n"
-                        f"Car: {obj.car.name}\n"
-                        f"Pickup: {obj.pickup_location}\n"
-                        f"Date: {obj.pickup_date} {obj.pickup_time}\n\n"
-                        "You may contact us for further details."
-                    )
-
-                if subject and message:
-                    try:
-                        send_mail(
-                            subject,
-                            message,
-                            from_email=None,
-                            recipient_list=[obj.user.email],
-                            fail_silently=True,
-                        )
-                        self.message_user(
-                            request, f"📧 Email sent to {obj.user.email}", level=messages.SUCCESS
-                        )
-                    except Exception as e:
-                        self.message_user(
-                            request, f"⚠️ Failed to send email: {e}", level=messages.WARNING
-                        )
-
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        status_changed = change and obj.original_status != obj.status
+        super().save_model(request, obj, form, change)
+        if status_changed and transitions.notification(obj, obj.status) and obj.user.email:
+            transitions.notify([obj], obj.status)
+            self.message_user(request, f"📧 Email queued for {obj.user.email}", level=messages.SUCCESS)
+
+    def _transition(self, request, queryset, status, verb):
+        changed, skipped = transitions.transition(queryset, status)
+        self.message_user(request, f"{len(changed)} booking(s) {verb}; emails queued.", level=messages.SUCCESS)
+        if skipped:
+            self.message_user(
+                request, f"{len(skipped)} booking(s) skipped: their status does not allow this.",
+                level=messages.WARNING,
+            )
+
+    @admin.action(description="Approve selected bookings")
+    def approve_selected(self, request, queryset):
+        self._transition(request, queryset, Booking.STATUS_APPROVED, "approved")
+
+    @admin.action(description="Reject selected bookings")
+    def reject_selected(self, request, queryset):
+        self._transition(request, queryset, Booking.STATUS_REJECTED, "rejected")
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "recipients")
+    ordering = ("-created_at",)
+    readonly_fields = ("attempts", "last_error", "created_at", "sent_at")
+
+
+@admin.register(ProcessedStripeEvent)
+class ProcessedStripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "processed_at")
+    list_filter = ("type",)
+    search_fields = ("event_id",)
+    ordering = ("-processed_at",)
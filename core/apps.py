@@ -5,4 +5,6 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        import core.signals
\ No newline at end of file
+        import core.signals
+        from core import contracts
+        contracts.template()  # compile the agreement template once, up front
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Per-day car availability.
+
+Active bookings claim one CarOccupancy row per rented day. A booking covers
+the half-open range [pickup_date, return_date), the same semantics as the
+old overlap query (pickup_date < other.return_date and
+return_date > other.pickup_date), so the return day is free for the next
+renter. A same-day rental (return_date == pickup_date) holds the pickup
+day, as core.pricing charges it as one day.
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Booking, Car, CarOccupancy
+
+ACTIVE_STATUSES = (Booking.STATUS_PENDING, Booking.STATUS_APPROVED, Booking.STATUS_PAID)
+# end_of_stay() needs the day after pickup to exist
+LAST_PICKUP_DATE = date.max - timedelta(days=1)
+
+
+class CarUnavailable(Exception):
+    pass
+
+
+def end_of_stay(pickup_date, return_date):
+    """First day after the booked range; never before the day after pickup."""
+    return max(return_date, pickup_date + timedelta(days=1))
+
+
+def booked_days(pickup_date, return_date):
+    return [pickup_date + timedelta(days=i) for i in range((end_of_stay(pickup_date, return_date) - pickup_date).days)]
+
+
+def is_available(car, pickup_date, return_date):
+    return not CarOccupancy.objects.filter(
+        car=car, day__gte=pickup_date, day__lt=end_of_stay(pickup_date, return_date)
+    ).exists()
+
+
+def available_cars(pickup_date, return_date, queryset=None):
+    """All cars with no booked day in [pickup_date, return_date), as one anti-join."""
+    queryset = Car.objects.all() if queryset is None else queryset
+    taken = CarOccupancy.objects.filter(
+        car=OuterRef("pk"), day__gte=pickup_date, day__lt=end_of_stay(pickup_date, return_date)
+    )
+    return queryset.filter(~Exists(taken))
+
+
+def _as_date(booking, field):
+    value = getattr(booking, field)
+    return Booking._meta.get_field(field).to_python(value)
+
+
+def sync_occupancy(booking):
+    """Make the booking's CarOccupancy rows match its current car, dates and status."""
+    wanted = set()
+    if booking.status in ACTIVE_STATUSES and booking.car_id and booking.return_date:
+        wanted = set(booked_days(_as_date(booking, "pickup_date"), _as_date(booking, "return_date")))
+
+    held = dict(
+        CarOccupancy.objects.filter(booking=booking).values_list("day", "car_id")
+    )
+    stale = [day for day, car_id in held.items() if day not in wanted or car_id != booking.car_id]
+    if stale:
+        CarOccupancy.objects.filter(booking=booking, day__in=stale).delete()
+
+    missing = wanted - (set(held) - set(stale))
+    if missing:
+        CarOccupancy.objects.bulk_create(
+            [CarOccupancy(car_id=booking.car_id, booking=booking, day=day) for day in sorted(missing)]
+        )
+
+
+def reserve(car, user, pickup_date, return_date, **fields):
+    """
+    Create a booking for `car` if the dates are free.
+
+    The car row is locked for the duration of the transaction so parallel
+    requests for the same car queue up instead of racing; the unique
+    (car, day) constraint backs this up on databases without row locks.
+    """
+    try:
+        with transaction.atomic():
+            Car.objects.select_for_update().only("pk").get(pk=car.pk)
+            if not is_available(car, pickup_date, return_date):
+                raise CarUnavailable
+            # Booking.save() quotes the price; post_save (core/signals.py)
+            # claims the days.
+            return Booking.objects.create(
+                user=user,
+                car=car,
+                pickup_date=pickup_date,
+                return_date=return_date,
+                **fields,
+            )
+    except IntegrityError:
+        raise CarUnavailable
@@ -0,0 +1,333 @@
+"""
+Query-count / latency benchmark for every route in core.urls.
+
+seed() grows a database to a given scale with synthetic owners, renters,
+cars, bookings and reviews. run() requests every route through the test
+client and records, per route, the status code, the number of queries,
+the median wall time and the peak Python memory. Each request runs inside a
+rolled-back transaction, so POST routes can be exercised without changing
+the data set, and the page cache is cleared first so cached views still
+show what they cost. Work deferred with transaction.on_commit (the outbox
+INSERT, cache bumps) runs before the rollback and is counted with the
+request. Files the routes write (signed contracts) go to a temporary
+MEDIA_ROOT that is removed afterwards.
+
+A fixed share of the data belongs to one "bench" owner and one "bench"
+renter, the users the authenticated routes run as, so their dashboards
+grow with the scale too. A route whose query count goes up between the
+smallest and the largest scale is flagged as scaling with data size (an
+N+1 or an unbounded list).
+
+Run it through `manage.py benchmark_views`, which does all of this in a
+throwaway test database.
+"""
+import logging
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, reset_queries, transaction
+from django.db.models import Max
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import availability, ratings, search, urls
+from .models import Booking, Car, CarOccupancy, Review, User
+from .owners import rebuild_summaries
+
+# Rows per unit of scale
+RATIOS = {"owners": 0.1, "renters": 0.1, "cars": 1, "bookings": 1, "reviews": 0.5}
+# One in BENCH_SHARE cars (and their bookings) belongs to the bench owner/renter
+BENCH_SHARE = 100
+BATCH_SIZE = 2000
+BENCH_OWNER = "bench-owner"
+BENCH_RENTER = "bench-renter"
+PASSWORD = "benchmark"
+
+Route = namedtuple("Route", "user method data skip", defaults=(None, "get", None, None))
+
+# How to exercise a route; anything not listed is an anonymous GET.
+# `data` is called with the Fixtures and returns the POST body.
+ROUTES = {
+    "profile": Route(user="renter"),
+    "booking": Route(user="renter", method="post", data=lambda f: {
+        "car": f.free_car, "pickup_location": "Airport", "drop_location": "Downtown",
+        "pickup_date": f.far_date, "pickup_time": "10:00",
+        "return_date": f.far_date + timedelta(days=2), "return_time": "10:00",
+    }),
+    "approve_booking": Route(user="owner"),
+    "reject_booking": Route(user="owner"),
+    "bulk_booking_action": Route(user="owner", method="post", data=lambda f: {"action": "approve", "ids": [f.booking]}),
+    "owner_dashboard": Route(user="owner"),
+    "add_car": Route(user="owner", method="post", data=lambda f: {
+        "name": "Bench Car", "year": 2025, "transmission": "AUTO",
+        "mileage": "0", "price": "99", "description": "",
+    }),
+    "edit_car": Route(user="owner", method="post", data=lambda f: {
+        "car_id": f.car, "name": "Bench Car", "year": 2024, "transmission": "AUTO",
+        "mileage": "1", "price": "99", "description": "",
+    }),
+    "delete_car": Route(user="owner", method="post", data=lambda f: {}),
+    "my_bookings": Route(user="renter"),
+    "my_bookings_api": Route(user="renter"),
+    "pay_booking": Route(user="renter"),
+    "payment_success": Route(user="renter"),
+    "stripe_webhook": Route(method="post", data=lambda f: {}),
+    "add_comment": Route(user="renter", method="post", data=lambda f: {"rating": 4, "comment": "Nice"}),
+    "approve_contract": Route(user="renter", method="post", data=lambda f: {"booking_id": f.booking}),
+    "booking_contract": Route(user="renter"),
+    "contact": Route(method="post", data=lambda f: {
+        "name": "Bench", "email": "bench@example.com", "subject": "Hi", "message": "Hello",
+    }),
+    "cache_stats": Route(user="admin"),
+    "metrics": Route(user="admin"),
+}
+QUERY_STRINGS = {
+    "search_cars": "?q=car",
+    "available_cars_api": "?pickup_date={far_date}&return_date={far_end}",
+}
+
+
+class Fixtures:
+    """Ids the routes are called with, looked up after seeding."""
+
+    def __init__(self):
+        self.owner = User.objects.get(username=BENCH_OWNER)
+        self.renter = User.objects.get(username=BENCH_RENTER)
+        self.admin = User.objects.filter(is_superuser=True).first()
+        bench_cars = Car.objects.filter(owner=self.owner).order_by("id")
+        self.car = bench_cars.first().pk
+        self.free_car = bench_cars.last().pk
+        self.booking = (
+            Booking.objects.filter(user=self.renter, car__owner=self.owner).order_by("id").first().pk
+        )
+        self.far_date = date.today() + timedelta(days=400)
+        self.far_end = self.far_date + timedelta(days=3)
+
+    def kwargs(self, converters):
+        values = {
+            "pk": self.car,
+            "car_id": self.car,
+            "owner_id": self.owner.pk,
+            "booking_id": self.booking,
+            "rendition": "card",
+            "fmt": "jpeg",
+        }
+        return {name: values[name] for name in converters}
+
+
+# ===========================
+# SEEDING
+# ===========================
+def _count(kind, scale):
+    return max(int(RATIOS[kind] * scale), 1)
+
+
+def _last_id(model):
+    return model.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def _create_users(prefix, role, start, stop, password):
+    User.objects.bulk_create(
+        [
+            User(
+                username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password=password,
+                role=role, is_approved=True, company_name=f"Company {i}" if role == "owner" else "",
+            )
+            for i in range(start, stop)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def seed(scale, stdout=None):
+    """Add rows until the database holds `scale` worth of data."""
+    password = make_password(PASSWORD)
+    if not User.objects.filter(username=BENCH_OWNER).exists():
+        User.objects.create(username=BENCH_OWNER, password=password, role="owner", is_approved=True,
+                            company_name="Bench Rentals", email="owner@example.com")
+        User.objects.create(username=BENCH_RENTER, password=password, email="renter@example.com")
+
+    owners_before = User.objects.filter(username__startswith="owner").count()
+    _create_users("owner", "owner", owners_before, _count("owners", scale), password)
+    renters_before = User.objects.filter(username__startswith="renter").count()
+    _create_users("renter", "user", renters_before, _count("renters", scale), password)
+
+    bench_owner = User.objects.get(username=BENCH_OWNER).pk
+    bench_renter = User.objects.get(username=BENCH_RENTER).pk
+    owners = list(User.objects.filter(username__startswith="owner").order_by("id").values_list("id", flat=True))
+    renters = list(User.objects.filter(username__startswith="renter").order_by("id").values_list("id", flat=True))
+
+    cars_before, last_car = Car.objects.count(), _last_id(Car)
+    Car.objects.bulk_create(
+        [
+            Car(
+                owner_id=bench_owner if i % BENCH_SHARE == 0 else owners[i % len(owners)],
+                name=f"Car {i}", year=2000 + i % 26, transmission=("AUTO", "MANUAL")[i % 2],
+                mileage=f"{i % 200}k", mileage_km=i % 200 * 1000, price=20 + i % 180, description=f"Synthetic car number {i}",
+            )
+            for i in range(cars_before, _count("cars", scale))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    car_prices = list(Car.objects.order_by("id").values_list("id", "price"))
+    car_ids = [pk for pk, _ in car_prices]
+    for car in Car.objects.filter(pk__gt=last_car).select_related("owner").iterator(chunk_size=500):
+        search.index_car(car)
+
+    # Booking i goes to car i, so the per-day occupancy never collides.
+    statuses = [s for s, _ in Booking.STATUS_CHOICES]
+    start = date.today() + timedelta(days=30)
+    bookings_before, last_booking = Booking.objects.count(), _last_id(Booking)
+    Booking.objects.bulk_create(
+        [
+            Booking(
+                user_id=bench_renter if i % BENCH_SHARE == 0 else renters[i % len(renters)],
+                car_id=car_ids[i % len(car_ids)], pickup_location="Airport", drop_location="Downtown",
+                pickup_date=start + timedelta(days=i % 60), pickup_time="10:00",
+                return_date=start + timedelta(days=i % 60 + 1 + i % 3), return_time="10:00",
+                status=statuses[(i + i // BENCH_SHARE) % len(statuses)],
+                days=1 + i % 3, total_price=car_prices[i % len(car_prices)][1] * (1 + i % 3),
+            )
+            for i in range(bookings_before, _count("bookings", scale))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    new_bookings = Booking.objects.filter(pk__gt=last_booking).values_list(
+        "id", "car_id", "pickup_date", "return_date", "status"
+    )
+    CarOccupancy.objects.bulk_create(
+        [
+            CarOccupancy(booking_id=pk, car_id=car_id, day=day)
+            for pk, car_id, pickup, ret, status in new_bookings
+            if status in availability.ACTIVE_STATUSES
+            for day in availability.booked_days(pickup, ret)
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    # Review i is on booking 2i+1. Even bookings, including every bench
+    # renter booking, stay unreviewed for add_comment.
+    booking_rows = list(Booking.objects.order_by("id").values_list("id", "car_id", "user_id"))
+    reviews_before = Review.objects.count()
+    Review.objects.bulk_create(
+        [
+            Review(booking_id=b, car_id=c, user_id=u, rating=1 + i % 5, comment=f"Review {i}")
+            for i in range(reviews_before, _count("reviews", scale))
+            for b, c, u in [booking_rows[(2 * i + 1) % len(booking_rows)]]
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    ratings.rebuild()
+    # bulk_create skips the signals that keep the directory summaries
+    rebuild_summaries()
+
+    if stdout:
+        stdout.write(
+            f"Seeded scale {scale}: {Car.objects.count()} cars, {Booking.objects.count()} bookings, "
+            f"{Review.objects.count()} reviews, {len(owners)} owners."
+        )
+
+
+# ===========================
+# MEASURING
+# ===========================
+def _routes(only=None):
+    for pattern in urls.urlpatterns:
+        if pattern.name and (not only or pattern.name in only):
+            yield pattern.name, getattr(pattern.pattern, "converters", {})
+
+
+def _request(client, method, url, data):
+    with transaction.atomic():
+        # Run the on_commit callbacks here; the rollback would drop them.
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            response = getattr(client, method)(url, data) if data is not None else getattr(client, method)(url)
+        transaction.set_rollback(True)
+    return response
+
+
+def _measure(client, method, url, data, repeat):
+    # One pass for queries and memory (tracemalloc slows everything down),
+    # then `repeat` timed passes. Each starts from a cold page cache.
+    cache.clear()
+    reset_queries()  # the query log is capped; a full one hides new entries
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as captured:
+        response = _request(client, method, url, data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # Count now: the next request_started signal clears the query log.
+    # BEGIN/ROLLBACK come from the wrapping transaction, not the view.
+    queries = sum(1 for q in captured if not q["sql"].startswith(("BEGIN", "ROLLBACK")))
+
+    timings = []
+    for _ in range(repeat):
+        cache.clear()
+        started = time.perf_counter()
+        _request(client, method, url, data)
+        timings.append(time.perf_counter() - started)
+
+    return {
+        "status": response.status_code,
+        "queries": queries,
+        "time_ms": round(statistics.median(timings) * 1000, 2),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def _run_route(name, converters, fixtures, users, repeat):
+    route = ROUTES.get(name, Route())
+    if route.skip:
+        return {"skipped": route.skip}
+    client = Client(raise_request_exception=False)
+    if route.user:
+        client.force_login(users[route.user])
+    url = reverse(name, kwargs=fixtures.kwargs(converters))
+    url += QUERY_STRINGS.get(name, "").format(**vars(fixtures))
+    data = route.data(fixtures) if route.data else None
+    return _measure(client, route.method, url, data, repeat)
+
+
+def run(repeat=3, only=None):
+    """Measure every route once (median of `repeat` runs for time)."""
+    fixtures = Fixtures()
+    users = {"owner": fixtures.owner, "renter": fixtures.renter, "admin": fixtures.admin}
+    results = {}
+    # Failing routes are reported by status code; skip the tracebacks.
+    request_logger = logging.getLogger("django.request")
+    previous_level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        # Measure our side of the payment routes, not Stripe's. The rollback
+        # doesn't undo file writes, so keep them out of the real MEDIA_ROOT.
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            PAYMENT_GATEWAY="core.payments.FakeGateway", MEDIA_ROOT=media_root
+        ):
+            for name, converters in _routes(only):
+                results[name] = _run_route(name, converters, fixtures, users, repeat)
+    finally:
+        request_logger.setLevel(previous_level)
+    return results
+
+
+def flag_scaling(results):
+    """
+    Routes whose query count rises from the smallest to the largest scale.
+    `results` maps route -> scale -> metrics.
+    """
+    flagged = {}
+    for name, by_scale in results.items():
+        scales = sorted(by_scale, key=int)
+        counts = [by_scale[scale].get("queries") for scale in scales]
+        if None not in counts and counts[-1] > counts[0]:
+            flagged[name] = dict(zip(scales, counts))
+    return flagged
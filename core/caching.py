@@ -0,0 +1,110 @@
+"""
+Versioned caching for the public pages.
+
+Cached data is keyed by the version number of every namespace it depends
+on: "catalog" for anything listing cars, "owners" for anything showing
+owner details, "car:<id>" for one car's reviews and "owner:<id>" for one
+owner's profile. Invalidating a namespace just increments its version, so
+stale entries are never read again and simply expire.
+
+core/signals.py invalidates after commit whenever a Car, Review or owner
+User changes. Code that writes with queryset.update() has to call the
+invalidate_* helpers itself.
+
+Every lookup bumps a hit or miss counter per view; stats() reports them.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+DEFAULT_TIMEOUT = 300  # seconds
+VERSION_TIMEOUT = None  # versions must outlive the entries they guard
+
+
+def _version(namespace):
+    key = f"ns:{namespace}"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, VERSION_TIMEOUT)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        key = f"ns:{namespace}"
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never read yet, so nothing is cached under it.
+            pass
+
+
+def invalidate(*namespaces):
+    """Drop everything cached under `namespaces` once the transaction commits."""
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def invalidate_car(car_id):
+    invalidate("catalog", f"car:{car_id}")
+
+
+def invalidate_owner(owner_id):
+    invalidate("owners", f"owner:{owner_id}")
+
+
+def version(*namespaces):
+    """Current combined version of `namespaces`; changes whenever one is invalidated."""
+    return ".".join(str(_version(ns)) for ns in namespaces)
+
+
+def make_key(name, namespaces, parts):
+    versions = version(*namespaces)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"view:{name}:{versions}:{digest}"
+
+
+def _count(name, outcome):
+    key = f"stats:{name}:{outcome}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_or_set(name, namespaces, parts, compute, timeout=DEFAULT_TIMEOUT):
+    """
+    Return compute()'s cached result for view `name`. `parts` distinguishes
+    variants of the same view (page, filters, object id). It must be
+    repr()-stable.
+    """
+    key = make_key(name, namespaces, parts)
+    value = cache.get(key)
+    if value is not None:
+        _count(name, "hits")
+        return value
+    _count(name, "misses")
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def stats(names):
+    """Hit/miss counts and hit ratio per view, plus a total."""
+    counters = cache.get_many([f"stats:{n}:{o}" for n in names for o in ("hits", "misses")])
+    result = {}
+    total_hits = total_misses = 0
+    for name in names:
+        hits = counters.get(f"stats:{name}:hits", 0)
+        misses = counters.get(f"stats:{name}:misses", 0)
+        total_hits += hits
+        total_misses += misses
+        result[name] = {"hits": hits, "misses": misses, "hit_ratio": _ratio(hits, misses)}
+    result["total"] = {"hits": total_hits, "misses": total_misses, "hit_ratio": _ratio(total_hits, total_misses)}
+    return result
+
+
+def _ratio(hits, misses):
+    return round(hits / (hits + misses), 3) if hits + misses else None
@@ -0,0 +1,93 @@
+"""
+Conditional GET for the public pages.
+
+A page's validators come from the updated_at timestamps of what it
+renders, read with indexed aggregates before any other work. newest()
+is a MAX(updated_at) answered from an index, for whole tables. stamp()
+also counts the rows, which catches deletions in a narrow queryset (one
+car's reviews, one owner's fleet). Deleting a car refreshes its owner's
+OwnerSummary, so the summaries' newest updated_at catches deletions from
+the catalog as a whole. The ETag hashes the stamps with the path and
+query string, and Last-Modified is the newest stamp. A request whose If-None-Match / If-Modified-Since still match gets
+304 Not Modified without building or rendering the page.
+
+HTML pages greet the signed-in user and carry a CSRF token, so they vary
+per user and are only cached by the browser (PAGE_CACHE_CONTROL): it keeps
+the copy and revalidates on every visit. The JSON endpoints are the same
+for everyone and may be shared by proxies for a minute (API_CACHE_CONTROL).
+
+Car, Review, Booking and OwnerSummary carry updated_at. Code that writes
+them with queryset.update() sets it itself (see Booking.status_fields,
+core/ratings.py, core/images.py and core/owners.py).
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+PAGE_CACHE_CONTROL = {"private": True, "no_cache": True}
+API_CACHE_CONTROL = {"public": True, "max_age": 60}
+
+
+def newest(queryset):
+    return queryset.order_by().aggregate(last_modified=Max("updated_at"))["last_modified"]
+
+
+def stamp(queryset):
+    """(newest updated_at, row count) of `queryset`, in one aggregate query."""
+    summary = queryset.order_by().aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+    return summary["last_modified"], summary["count"]
+
+
+def validators(request, stamps, per_user=False):
+    """(ETag, Last-Modified timestamp or None) for `request` given its page's stamps."""
+    parts = (request.path, sorted(request.GET.lists()), stamps)
+    if per_user:
+        parts += (request.user.pk,)
+    etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+    times = [value for value in stamps if isinstance(value, datetime)]
+    return etag, int(max(times).timestamp()) if times else None
+
+
+def conditional(stamps, cache_control=PAGE_CACHE_CONTROL):
+    """
+    Decorate a GET view with ETag / Last-Modified validators and a
+    Cache-Control policy. `stamps(request, *args, **kwargs)` returns a flat
+    tuple of what the page is built from (see stamp()), or None to let the
+    view answer on its own, e.g. with a 404. The view finds the tuple on
+    request.stamps, e.g. to key its cache by it without reading it twice;
+    it is None when the validators were skipped.
+    """
+    per_user = cache_control.get("private", False)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.stamps = None
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            # A flash message is shown once, by a full render.
+            if per_user and len(get_messages(request)):
+                return view(request, *args, **kwargs)
+            current = request.stamps = stamps(request, *args, **kwargs)
+            if current is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators(request, current, per_user)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault("ETag", etag)
+                if last_modified:
+                    response.headers.setdefault("Last-Modified", http_date(last_modified))
+                patch_cache_control(response, **cache_control)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,100 @@
+"""
+Rental agreements.
+
+When a renter accepts the agreement for a booking, sign() renders it once
+from contracts/rental_agreement.html. The HTML is stored under
+MEDIA_ROOT/contracts/, named by the SHA-256 of its content, and recorded
+on Booking.contract_file. Later requests serve that file instead of
+rendering again. An identical document is only ever stored once.
+
+The compiled template is loaded once per process (CoreConfig.ready warms
+it), not on every request.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from . import outbox
+from .models import Booking
+
+TEMPLATE_NAME = "contracts/rental_agreement.html"
+CONTRACT_DIR = "contracts"
+CONTENT_TYPE = "text/html"
+DEFAULT_COMPANY = "Royal Cars Company"
+
+
+@lru_cache(maxsize=None)
+def template():
+    return get_template(TEMPLATE_NAME)
+
+
+def company_name(booking):
+    owner = booking.car.owner if booking.car else None
+    return owner.company_name if owner and owner.company_name else DEFAULT_COMPANY
+
+
+def render(booking, signed_at):
+    renter = booking.user
+    return template().render({
+        "booking": booking,
+        "company_name": company_name(booking),
+        "renter_name": renter.get_full_name() or renter.username,
+        "signed_at": signed_at,
+    })
+
+
+def store(content):
+    """Save `content` under its SHA-256 and return the storage name."""
+    data = content.encode()
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{CONTRACT_DIR}/{digest[:2]}/{digest}.html"
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def etag(name):
+    """Contracts are content-addressed, so the file name is the ETag."""
+    return '"' + name.rsplit("/", 1)[-1].split(".", 1)[0] + '"'
+
+
+def filename(booking):
+    return f"royal-cars-agreement-{booking.pk}.html"
+
+
+def sign(booking):
+    """
+    Record the renter's acceptance of `booking`'s agreement and email them
+    a copy. Returns True if this call signed it, and False if it was
+    already signed (a repeated click or a retried request).
+    """
+    if booking.contract_file:
+        return False
+    signed_at = timezone.now()
+    name = store(render(booking, signed_at))
+    with transaction.atomic():
+        signed = Booking.objects.filter(pk=booking.pk, contract_file="").update(
+            contract_file=name, contract_signed_at=signed_at, updated_at=signed_at
+        )
+        if not signed:
+            return False
+        booking.contract_file, booking.contract_signed_at = name, signed_at
+        company = company_name(booking)
+        outbox.enqueue(
+            subject=f"✅ Rental Agreement Confirmation - {company}",
+            message=(
+                f"Hello {booking.user.get_full_name() or booking.user.username},\n\n"
+                f"Thank you for accepting the rental agreement for {booking.car.name} "
+                f"({booking.pickup_date} → {booking.return_date}). A copy is attached to this email.\n\n"
+                f"{company} Team"
+            ),
+            from_email="noreply@royalcars.com",
+            recipient_list=[booking.user.email],
+            attachments=[{"path": name, "filename": filename(booking), "mimetype": CONTENT_TYPE}],
+        )
+    return True
@@ -0,0 +1,65 @@
+"""
+Owner dashboard statistics. Each figure is a single GROUP BY query, so the
+dashboard costs the same number of queries for 5 cars or 5,000.
+"""
+import calendar
+from datetime import date
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Booking, CarOccupancy
+
+UTILIZATION_MONTHS = 12
+
+
+def bookings_per_status(owner):
+    rows = (
+        Booking.objects.filter(car__owner=owner)
+        .order_by()
+        .values("status")
+        .annotate(count=Count("id"))
+    )
+    counts = {row["status"]: row["count"] for row in rows}
+    return [(label, counts.get(status, 0)) for status, label in Booking.STATUS_CHOICES]
+
+
+def revenue_per_car(owner):
+    return (
+        Booking.objects.filter(car__owner=owner, status=Booking.STATUS_PAID)
+        .order_by()
+        .values("car_id", "car__name")
+        .annotate(bookings=Count("id"), revenue=Sum("total_price"))
+        .order_by("-revenue")
+    )
+
+
+def _months_back(today, months):
+    month_index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def utilization_per_month(owner, fleet_size, today=None):
+    """Booked car-days per month over the last year, as a share of fleet capacity."""
+    today = today or date.today()
+    rows = (
+        CarOccupancy.objects.filter(
+            car__owner=owner,
+            day__gte=_months_back(today, UTILIZATION_MONTHS),
+            day__lte=today.replace(day=calendar.monthrange(today.year, today.month)[1]),
+        )
+        .annotate(month=TruncMonth("day"))
+        .order_by("month")
+        .values("month")
+        .annotate(booked_days=Count("id"))
+    )
+    result = []
+    for row in rows:
+        month = row["month"]
+        capacity = fleet_size * calendar.monthrange(month.year, month.month)[1]
+        result.append({
+            "month": month,
+            "booked_days": row["booked_days"],
+            "utilization": round(100 * row["booked_days"] / capacity, 1) if capacity else 0,
+        })
+    return result
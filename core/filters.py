@@ -0,0 +1,46 @@
+"""
+Query-string filters shared by the catalog APIs.
+"""
+from decimal import Decimal, InvalidOperation
+
+from .models import Car
+
+# query param -> (lookup, parser)
+RANGE_FILTERS = {
+    "min_year": ("year__gte", int),
+    "max_year": ("year__lte", int),
+    "min_price": ("price__gte", Decimal),
+    "max_price": ("price__lte", Decimal),
+    "min_rating": ("rating_avg__gte", Decimal),
+    # Kilometres; cars whose mileage text couldn't be parsed never match
+    "min_mileage": ("mileage_km__gte", int),
+    "max_mileage": ("mileage_km__lte", int),
+}
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def parse_car_filters(params):
+    """Turn GET params into ORM lookups; raises InvalidFilter on bad input."""
+    lookups = {}
+    for param, (lookup, parse) in RANGE_FILTERS.items():
+        raw = params.get(param)
+        if raw in (None, ""):
+            continue
+        try:
+            value = parse(raw)
+        except (ValueError, InvalidOperation):
+            raise InvalidFilter(f"{param} must be a number.")
+        # Decimal accepts "NaN" and "Infinity", which no column can hold
+        if isinstance(value, Decimal) and not value.is_finite():
+            raise InvalidFilter(f"{param} must be a number.")
+        lookups[lookup] = value
+
+    transmission = params.get("transmission")
+    if transmission:
+        if transmission not in dict(Car.TRANSMISSION_CHOICES):
+            raise InvalidFilter("Unknown transmission.")
+        lookups["transmission"] = transmission
+    return lookups
@@ -0,0 +1,181 @@
+"""
+Resized renditions of Car.image.
+
+Uploads are stored as-is and the car is marked IMAGE_PENDING; nothing is
+decoded during the request. `manage.py process_car_images` picks pending
+cars up and builds the renditions in a process pool. For each upload it
+validates the dimensions and writes a few fixed widths in WebP and JPEG
+under MEDIA_ROOT/cars/renditions/. Re-encoding drops the EXIF block,
+including any GPS position.
+
+File names carry a hash of the original's bytes, so a rendition URL never
+changes content and a replaced image gets fresh URLs. Until a car's
+renditions are ready, pages show a placeholder.
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import caching
+from .models import Car
+
+# name -> target width in px
+RENDITIONS = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 1200,
+}
+# format -> (PIL format, save options)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+RENDITION_DIR = "cars/renditions"
+HASH_LENGTH = 16
+PLACEHOLDER = "img/car-placeholder.svg"
+
+MIN_SIDE = 200  # px
+MAX_PIXELS = 40_000_000
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def rendition_path(image_hash, name, fmt):
+    return f"{RENDITION_DIR}/{image_hash}-{name}.{fmt}"
+
+
+def has_renditions(car):
+    """True when the stored renditions were built from the current image."""
+    return bool(
+        car.image
+        and car.image_status == Car.IMAGE_READY
+        and car.image_hash
+        and car.image_source == car.image.name
+    )
+
+
+def rendition_url(car, name, fmt="jpeg"):
+    if not car.image:
+        return ""
+    if has_renditions(car):
+        return default_storage.url(rendition_path(car.image_hash, name, fmt))
+    return static(PLACEHOLDER)
+
+
+def srcset(car, fmt):
+    return ", ".join(
+        f"{rendition_url(car, name, fmt)} {width}w" for name, width in RENDITIONS.items()
+    )
+
+
+# ---------------------------------------------------------------------------
+# Worker side. These functions only touch file storage, never the database,
+# so they are safe to run in a child process.
+# ---------------------------------------------------------------------------
+
+def _validate(image):
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise InvalidImage(f"Image is too large ({width}x{height}).")
+    if min(width, height) < MIN_SIDE:
+        raise InvalidImage(f"Image is too small ({width}x{height}); at least {MIN_SIDE}px per side.")
+
+
+def _flatten(image, mode):
+    """Convert to `mode`, compositing any transparency onto white."""
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        if mode == "RGBA":
+            return image
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    out = io.BytesIO()
+    # No exif= argument: the metadata is not carried over.
+    _flatten(image, "RGBA" if fmt == "webp" else "RGB").save(out, pil_format, **options)
+    return out.getvalue()
+
+
+def build_renditions(image_name):
+    """
+    Write every missing rendition of the stored file `image_name`; returns
+    its content hash. Raises InvalidImage or OSError for unusable uploads.
+    """
+    with default_storage.open(image_name, "rb") as f:
+        data = f.read()
+    image_hash = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+    with Image.open(io.BytesIO(data)) as original:
+        # size comes from the header, so this runs before any pixel is decoded
+        _validate(original)
+        original = ImageOps.exif_transpose(original)
+        for name, width in RENDITIONS.items():
+            paths = {fmt: rendition_path(image_hash, name, fmt) for fmt in FORMATS}
+            if all(default_storage.exists(p) for p in paths.values()):
+                continue
+            resized = original.copy()
+            # Never upscale: small originals are stored at their own size.
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for fmt, path in paths.items():
+                if not default_storage.exists(path):
+                    default_storage.save(path, ContentFile(_encode(resized, fmt)))
+    return image_hash
+
+
+# ---------------------------------------------------------------------------
+# Coordinator side
+# ---------------------------------------------------------------------------
+
+def _finish(car_id, image_name, **fields):
+    # Filtering on the image name drops the result if the owner uploaded a
+    # newer file meanwhile; that one is already pending again.
+    # update() rather than save(): nothing the Car post_save handlers index.
+    updated = Car.objects.filter(pk=car_id, image=image_name).update(
+        image_source=image_name, updated_at=timezone.now(), **fields
+    )
+    if updated:
+        caching.invalidate_car(car_id)
+    return updated
+
+
+def process_pending(executor, batch_size=20):
+    """
+    Build renditions for up to `batch_size` pending cars on `executor`.
+    Returns (ready, failed) lists of (car_id, detail) pairs.
+    """
+    pending = list(
+        Car.objects.filter(image_status=Car.IMAGE_PENDING)
+        .order_by("id")
+        .values_list("id", "image")[:batch_size]
+    )
+    cleared = [car_id for car_id, name in pending if not name]
+    if cleared:
+        # The image was removed after the upload was queued.
+        Car.objects.filter(pk__in=cleared, image_status=Car.IMAGE_PENDING).update(
+            image_status=Car.IMAGE_READY, updated_at=timezone.now()
+        )
+    futures = [(car_id, name, executor.submit(build_renditions, name)) for car_id, name in pending if name]
+
+    ready, failed = [], []
+    for car_id, name, future in futures:
+        try:
+            image_hash = future.result()
+        except Exception as e:
+            _finish(car_id, name, image_hash="", image_status=Car.IMAGE_FAILED)
+            failed.append((car_id, str(e)))
+        else:
+            _finish(car_id, name, image_hash=image_hash, image_status=Car.IMAGE_READY)
+            ready.append((car_id, image_hash))
+    return ready, failed
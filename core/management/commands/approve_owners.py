@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core import owners
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Approve pending owner accounts in chunks and queue their welcome emails, reporting progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Owners to approve; all pending owners if omitted.")
+        parser.add_argument("--chunk-size", type=int, default=owners.CHUNK_SIZE, help="Owners per UPDATE.")
+
+    def handle(self, *args, **options):
+        queryset = User.objects.all()
+        if options["usernames"]:
+            queryset = queryset.filter(username__in=options["usernames"])
+
+        approved = selected = 0
+        for approved, selected in owners.approve(queryset, options["chunk_size"]):
+            self.stdout.write(f"Approved {approved}/{selected} owner(s)...")
+        self.stdout.write(f"Approved {approved} owner account(s); emails queued.")
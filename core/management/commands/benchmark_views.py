@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at increasing scales and record queries, time and "
+        "peak memory for every route in core.urls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000],
+                            help="Data sizes to measure at, e.g. 1000 10000 100000.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per route (median is kept).")
+        parser.add_argument("--routes", nargs="+", help="Only these URL names.")
+        parser.add_argument("--output", default="benchmark.json", help="Where to write the JSON report.")
+
+    def handle(self, *args, **options):
+        scales = sorted(set(options["scales"]))
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {}
+            for scale in scales:
+                benchmark.seed(scale, self.stdout)
+                for name, metrics in benchmark.run(options["repeat"], options["routes"]).items():
+                    results.setdefault(name, {})[str(scale)] = metrics
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        flagged = benchmark.flag_scaling(results)
+        report = {
+            "backend": connection.vendor,
+            "scales": scales,
+            "ratios": benchmark.RATIOS,
+            "results": results,
+            "scales_with_data": flagged,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+        self._summary(results, scales, flagged)
+        self.stdout.write(f"Report written to {options['output']}.")
+
+    def _summary(self, results, scales, flagged):
+        header = f"{'route':<22}" + "".join(f"{'q@' + str(s):>10}{'ms@' + str(s):>11}" for s in scales)
+        self.stdout.write(header)
+        for name, by_scale in results.items():
+            row = f"{name:<22}"
+            for scale in scales:
+                metrics = by_scale.get(str(scale), {})
+                if "skipped" in metrics:
+                    row += f"{'skipped':>21}"
+                else:
+                    row += f"{metrics['queries']:>10}{metrics['time_ms']:>11}"
+            line = row + ("  <-- grows with data" if name in flagged else "")
+            self.stdout.write(self.style.WARNING(line) if name in flagged else line)
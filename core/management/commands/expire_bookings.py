@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import transitions
+
+
+class Command(BaseCommand):
+    help = "Expire pending and approved bookings whose hold has ended, freeing their dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=transitions.EXPIRE_BATCH_SIZE)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep sweeping instead of exiting after one pass."
+        )
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between sweeps with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            expired = sum(len(batch) for batch in transitions.expire_stale(options["batch_size"]))
+            if expired or not options["loop"]:
+                self.stdout.write(f"Expired {expired} booking(s).")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import images
+
+
+class Command(BaseCommand):
+    help = "Build resized renditions for uploaded car images in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for uploads instead of exiting when none are pending."
+        )
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        # Children only read and write files; don't let them inherit the
+        # parent's database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as executor:
+            while True:
+                total_ready = total_failed = 0
+                while True:
+                    ready, failed = images.process_pending(executor, options["batch_size"])
+                    for car_id, error in failed:
+                        self.stderr.write(f"Car {car_id}: {error}")
+                    total_ready += len(ready)
+                    total_failed += len(failed)
+                    if len(ready) + len(failed) < options["batch_size"]:
+                        break
+
+                if total_ready or total_failed or not options["loop"]:
+                    self.stdout.write(f"Processed {total_ready} image(s), {total_failed} failed.")
+                if not options["loop"]:
+                    return
+                time.sleep(options["interval"])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import owners
+
+
+class Command(BaseCommand):
+    help = "Recompute every owner's directory summary (fleet size, prices, rating, bookings)."
+
+    def handle(self, *args, **options):
+        count = owners.rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Updated summaries for {count} owner(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute Car.rating_avg and Car.review_count from the Review table."
+
+    def handle(self, *args, **options):
+        count = ratings.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Updated ratings for {count} car(s)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the car search index from the Car table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} car(s)."))
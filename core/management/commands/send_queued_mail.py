@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued outbound emails in batches over a single SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling the queue instead of exiting when it is empty."
+        )
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = outbox.send_batch(options["batch_size"])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options["batch_size"]:
+                    break
+
+            if total_sent or total_failed or not options["loop"]:
+                self.stdout.write(f"Sent {total_sent} email(s), {total_failed} failed.")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,173 @@
+"""
+In-process request metrics.
+
+core.middleware.PerformanceMiddleware opens a RequestTimings for every
+request and fills it with SQL time (through connection.execute_wrapper),
+template render time and time spent in external services. Code that
+calls out to SMTP, Stripe and so on wraps the call in
+`with metrics.external("stripe"):`. Outside a request that is a no-op.
+
+Finished requests are counted into cumulative histograms, one per view
+and phase, that only ever grow for the life of the process, as Prometheus
+counters must; rate() and histogram_quantile() over the scrapes give the
+recent picture. render_prometheus() writes them out. Nothing is shared
+between processes and no external service is needed.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds, in seconds, of the latency buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+PHASES = ("total", "sql", "template", "external")
+
+_current = ContextVar("request_timings", default=None)
+# (metric name, (view, phase)) -> Histogram; phase is None for query counts
+_histograms = {}
+_histograms_lock = threading.Lock()
+_template_lock = threading.Lock()
+_template_timer_installed = False
+
+
+class RequestTimings:
+    def __init__(self):
+        self.sql_time = 0.0
+        self.sql_count = 0
+        self.template_time = 0.0
+        self.external_time = defaultdict(float)
+        self._template_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+
+    def server_timing(self, total):
+        parts = [
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+        ]
+        parts += [f"{name};dur={spent * 1000:.1f}" for name, spent in sorted(self.external_time.items())]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _observe(name, labels, value, buckets):
+    if (name, labels) not in _histograms:
+        _histograms[name, labels] = Histogram(buckets)
+    _histograms[name, labels].observe(value)
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish_request(token, view, timings, total):
+    _current.reset(token)
+    phases = (total, timings.sql_time, timings.template_time, sum(timings.external_time.values()))
+    with _histograms_lock:
+        for phase, value in zip(PHASES, phases):
+            _observe("royalcars_request_seconds", (view, phase), value, BUCKETS)
+        _observe("royalcars_request_queries", (view, None), timings.sql_count, QUERY_BUCKETS)
+
+
+@contextmanager
+def external(service):
+    """Time a call to an outside service against the current request."""
+    timings = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.external_time[service] += time.perf_counter() - started
+
+
+def install_template_timer():
+    """
+    Time Template.render. Included and extended templates render through
+    the same method, so only the outermost call per request is counted.
+    """
+    global _template_timer_installed
+    from django.template.base import Template
+
+    with _template_lock:
+        if _template_timer_installed:
+            return
+        original = Template.render
+
+        def render(self, context):
+            timings = _current.get()
+            if timings is None:
+                return original(self, context)
+            timings._template_depth += 1
+            started = time.perf_counter()
+            try:
+                return original(self, context)
+            finally:
+                timings._template_depth -= 1
+                if timings._template_depth == 0:
+                    timings.template_time += time.perf_counter() - started
+
+        Template.render = render
+        _template_timer_installed = True
+
+
+# ===========================
+# EXPOSITION
+# ===========================
+METRICS = {
+    "royalcars_request_seconds": "Time per request phase.",
+    "royalcars_request_queries": "SQL queries per request.",
+}
+
+
+def _histogram(lines, name, labels, buckets, counts, total, count):
+    label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    for bound, bucket_count in zip(buckets, counts):
+        lines.append(f'{name}_bucket{{{label_str},le="{bound}"}} {bucket_count}')
+    lines.append(f'{name}_bucket{{{label_str},le="+Inf"}} {count}')
+    lines.append(f"{name}_sum{{{label_str}}} {total:.6f}")
+    lines.append(f"{name}_count{{{label_str}}} {count}")
+
+
+def render_prometheus():
+    """The histograms in Prometheus text exposition format (0.0.4)."""
+    with _histograms_lock:
+        snapshot = [
+            (name, view, phase, h.buckets, list(h.counts), h.sum, h.count)
+            for (name, (view, phase)), h in _histograms.items()
+        ]
+    snapshot.sort(key=lambda row: (row[0], row[1], PHASES.index(row[2]) if row[2] else 0))
+
+    lines = []
+    for name, help_text in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for metric, view, phase, *values in snapshot:
+            if metric == name:
+                _histogram(lines, name, {"view": view, "phase": phase} if phase else {"view": view}, *values)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,33 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    """
+    Times each request (SQL, templates, external calls, total), reports it
+    in a Server-Timing header and records it for the /monitoring/metrics/
+    endpoint. Keep it first in MIDDLEWARE so the total covers the rest.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install_template_timer()
+
+    def __call__(self, request):
+        timings, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - started
+            match = getattr(request, "resolver_match", None)
+            metrics.finish_request(token, match.view_name if match else "unresolved", timings, total)
+        response["Server-Timing"] = timings.server_timing(total)
+        return response
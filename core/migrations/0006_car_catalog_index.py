@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_review'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='car',
+            options={'ordering': ['-year', 'name', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['-year', 'name', 'id'], name='car_catalog_idx'),
+        ),
+    ]
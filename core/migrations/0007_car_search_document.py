@@ -0,0 +1,70 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = "core_carsearch_fts"
+MYSQL_FULLTEXT_INDEX = "car_search_body_ft"
+
+
+def create_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == "mysql":
+        schema_editor.execute(
+            f"ALTER TABLE core_carsearchdocument ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} (body)"
+        )
+
+
+def drop_text_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def index_existing_cars(apps, schema_editor):
+    Car = apps.get_model("core", "Car")
+    CarSearchDocument = apps.get_model("core", "CarSearchDocument")
+    transmissions = dict(Car._meta.get_field("transmission").choices)
+
+    for car in Car.objects.select_related("owner").iterator():
+        parts = [
+            car.name,
+            car.description,
+            car.owner.company_name if car.owner else "",
+            str(car.year),
+            car.transmission,
+            transmissions.get(car.transmission, ""),
+        ]
+        body = " ".join(p for p in parts if p)
+        CarSearchDocument.objects.create(
+            car=car, body=body, year=car.year, transmission=car.transmission
+        )
+        if schema_editor.connection.vendor == "sqlite":
+            schema_editor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)", [car.pk, body]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_car_catalog_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarSearchDocument',
+            fields=[
+                ('car', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.car')),
+                ('body', models.TextField()),
+                ('year', models.PositiveIntegerField()),
+                ('transmission', models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(index_existing_cars, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:40
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ACTIVE_STATUSES = ["pending", "approved", "paid"]
+
+
+def occupy_active_bookings(apps, schema_editor):
+    Booking = apps.get_model("core", "Booking")
+    CarOccupancy = apps.get_model("core", "CarOccupancy")
+
+    rows = []
+    bookings = Booking.objects.filter(
+        status__in=ACTIVE_STATUSES, car__isnull=False, return_date__isnull=False
+    ).order_by("created_at")
+    for booking in bookings.iterator():
+        # availability.end_of_stay as of this migration: a same-day rental
+        # holds its pickup day
+        end = max(booking.return_date, booking.pickup_date + datetime.timedelta(days=1))
+        day = booking.pickup_date
+        while day < end:
+            rows.append(CarOccupancy(car_id=booking.car_id, booking=booking, day=day))
+            day += datetime.timedelta(days=1)
+    # Overlaps that slipped in before the constraint existed keep the
+    # earliest booking's claim on the day.
+    CarOccupancy.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_car_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core.booking')),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core.car')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('car', 'day'), name='car_occupancy_unique_day')],
+            },
+        ),
+        migrations.RunPython(occupy_active_bookings, migrations.RunPython.noop),
+    ]
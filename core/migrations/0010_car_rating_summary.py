@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:49
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def summarize_reviews(apps, schema_editor):
+    Car = apps.get_model("core", "Car")
+    Review = apps.get_model("core", "Review")
+    rows = Review.objects.order_by().values("car").annotate(total=Sum("rating"), count=Count("id"))
+    for row in rows.iterator():
+        Car.objects.filter(pk=row["car"]).update(
+            rating_sum=row["total"],
+            review_count=row["count"],
+            rating_avg=(Decimal(row["total"]) / row["count"]).quantize(Decimal("0.01")),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['-rating_avg', 'id'], name='car_rating_idx'),
+        ),
+        migrations.RunPython(summarize_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_car_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_source',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
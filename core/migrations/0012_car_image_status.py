@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    """Uploads from before the worker existed have no renditions yet."""
+    Car = apps.get_model("core", "Car")
+    Car.objects.exclude(image="").exclude(image__isnull=True).filter(image_hash="").update(
+        image_status="pending"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_car_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['image_status'], name='car_image_status_idx'),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
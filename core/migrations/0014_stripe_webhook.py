@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedStripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('processed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='stripe_session_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['stripe_session_id'], name='booking_stripe_session_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:08
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def quote_existing_bookings(apps, schema_editor):
+    """Price old bookings at the car's current daily rate, one rate per day."""
+    Booking = apps.get_model("core", "Booking")
+    batch = []
+    rows = Booking.objects.select_related("car").only("pickup_date", "return_date", "car__price")
+    for booking in rows.iterator(chunk_size=BATCH_SIZE):
+        booking.days = max((booking.return_date - booking.pickup_date).days, 1)
+        booking.total_price = booking.car.price * booking.days if booking.car else 0
+        batch.append(booking)
+        if len(batch) == BATCH_SIZE:
+            Booking.objects.bulk_update(batch, ["days", "total_price"])
+            batch = []
+    Booking.objects.bulk_update(batch, ["days", "total_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_stripe_webhook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='days',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(quote_existing_bookings, migrations.RunPython.noop),
+    ]
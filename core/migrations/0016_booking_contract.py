@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_booking_quote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='contract_file',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='contract_signed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='attachments',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:14
+
+from datetime import timedelta
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_holds(apps, schema_editor):
+    """
+    Existing bookings changed status when they were created. Open ones get a
+    fresh hold from now, so the first sweep doesn't expire them all at once.
+    """
+    Booking = apps.get_model("core", "Booking")
+    Booking.objects.update(status_changed_at=F("created_at"))
+    now = django.utils.timezone.now()
+    Booking.objects.filter(status="pending").update(expires_at=now + timedelta(days=2))
+    Booking.objects.filter(status="approved").update(expires_at=now + timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_booking_contract'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('paid', 'Paid'), ('expired', 'Expired')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'expires_at'], name='booking_hold_expiry_idx'),
+        ),
+        migrations.RunPython(start_holds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:18
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def build_summaries(apps, schema_editor):
+    User = apps.get_model("core", "User")
+    Car = apps.get_model("core", "Car")
+    Booking = apps.get_model("core", "Booking")
+    OwnerSummary = apps.get_model("core", "OwnerSummary")
+    summaries = []
+    for owner in User.objects.filter(role="owner").iterator():
+        fleet = Car.objects.filter(owner=owner).aggregate(
+            car_count=Count("id"), min_price=Min("price"), max_price=Max("price"),
+            rating_sum=Sum("rating_sum"), review_count=Sum("review_count"),
+        )
+        reviews = fleet["review_count"] or 0
+        rating = Decimal(fleet["rating_sum"] or 0) / reviews if reviews else Decimal(0)
+        summaries.append(OwnerSummary(
+            owner=owner,
+            listed=owner.is_approved and owner.is_active,
+            name=owner.company_name or owner.username,
+            car_count=fleet["car_count"],
+            min_price=fleet["min_price"] or 0,
+            max_price=fleet["max_price"] or 0,
+            rating_avg=rating.quantize(Decimal("0.01"), ROUND_HALF_UP),
+            review_count=reviews,
+            booking_count=Booking.objects.filter(car__owner=owner).count(),
+        ))
+    OwnerSummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_booking_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerSummary',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('listed', models.BooleanField(default=False)),
+                ('name', models.CharField(max_length=160)),
+                ('car_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('max_price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('rating_avg', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('booking_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listed', 'name', 'owner'], name='owner_summary_name_idx'), models.Index(fields=['listed', '-car_count', 'owner'], name='owner_summary_fleet_idx'), models.Index(fields=['listed', '-rating_avg', 'owner'], name='owner_summary_rating_idx'), models.Index(fields=['listed', '-booking_count', 'owner'], name='owner_summary_bookings_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_owner_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['owner', '-year', 'name', 'id'], name='car_owner_catalog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['owner', '-updated_at'], name='car_owner_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:24
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # The newest change we know of for existing rows.
+    apps.get_model("core", "Booking").objects.update(updated_at=F("status_changed_at"))
+    apps.get_model("core", "Review").objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_car_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['updated_at'], name='car_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ownersummary',
+            index=models.Index(fields=['updated_at'], name='owner_summary_updated_idx'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:25
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+# Frozen copy of core.mileage.parse as of this migration
+MILEAGE = re.compile(
+    r"^\s*(?P<number>\d[\d,\s]*(?:\.\d+)?)\s*(?P<thousands>k)?\s*(?P<unit>km|kms|kilometers?|kilometres?|mi|miles?)?\s*\.?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_mileage(text):
+    match = MILEAGE.match(text or "")
+    if not match:
+        return None
+    value = float(re.sub(r"[,\s]", "", match["number"]))
+    if match["thousands"]:
+        value *= 1000
+    if (match["unit"] or "").lower().startswith("mi"):
+        value *= 1.609344
+    return round(value)
+
+
+def parse_existing(apps, schema_editor):
+    Car = apps.get_model("core", "Car")
+    last_id = 0
+    while True:
+        batch = list(Car.objects.filter(pk__gt=last_id).order_by("pk").only("pk", "mileage")[:BATCH_SIZE])
+        if not batch:
+            break
+        for car in batch:
+            car.mileage_km = parse_mileage(car.mileage)
+        Car.objects.bulk_update(batch, ["mileage_km"])
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='mileage_km',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['price', 'id'], name='car_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['mileage_km', 'id'], name='car_mileage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['transmission', '-year', 'name', 'id'], name='car_transmission_catalog_idx'),
+        ),
+        migrations.RunPython(parse_existing, migrations.RunPython.noop),
+    ]
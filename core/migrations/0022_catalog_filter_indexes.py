@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_car_mileage_km'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_catalog_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_rating_idx',
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['-year', 'name', 'id', 'price', 'mileage_km'], name='car_catalog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['-rating_avg', 'id', 'price', 'mileage_km'], name='car_rating_idx'),
+        ),
+    ]
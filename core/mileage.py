@@ -0,0 +1,30 @@
+"""
+Car mileage as a number.
+
+Owners type mileage as free text ("10k", "45,000 km", "30k miles"). The
+text is kept for display in Car.mileage, and parse() derives
+Car.mileage_km from it on every save, so the catalog can filter on an
+indexed integer. Text that doesn't read as a distance leaves mileage_km
+empty; such cars simply drop out of mileage-filtered listings.
+"""
+import re
+
+KM_PER_MILE = 1.609344
+
+_MILEAGE = re.compile(
+    r"^\s*(?P<number>\d[\d,\s]*(?:\.\d+)?)\s*(?P<thousands>k)?\s*(?P<unit>km|kms|kilometers?|kilometres?|mi|miles?)?\s*\.?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse(text):
+    """Kilometres in `text`, as an int, or None if it can't be read."""
+    match = _MILEAGE.match(text or "")
+    if not match:
+        return None
+    value = float(re.sub(r"[,\s]", "", match["number"]))
+    if match["thousands"]:
+        value *= 1000
+    if (match["unit"] or "").lower().startswith("mi"):
+        value *= KM_PER_MILE
+    return round(value)
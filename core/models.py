@@ -1,9 +1,15 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
 
+from . import pricing
+from .mileage import parse as parse_mileage
+
 
 # =====================
 # Custom User Model
@@ -30,6 +36,12 @@ class User(AbstractUser):
     def is_admin(self):
         return self.role == self.Roles.ADMIN
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Approved-owner lists on the homepage and companies page
+            models.Index(fields=["role", "is_approved"], name="user_role_approved_idx"),
+        ]
+
 
 # =====================
 # Car Model
@@ -39,6 +51,14 @@ class Car(models.Model):
         ("AUTO", "Automatic"),
         ("MANUAL", "Manual"),
     ]
+    IMAGE_PENDING = "pending"
+    IMAGE_READY = "ready"
+    IMAGE_FAILED = "failed"
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, "Pending"),
+        (IMAGE_READY, "Ready"),
+        (IMAGE_FAILED, "Failed"),
+    ]
 
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -52,15 +72,57 @@ class Car(models.Model):
     year = models.PositiveIntegerField()
     transmission = models.CharField(max_length=20, choices=TRANSMISSION_CHOICES)
     mileage = models.CharField(max_length=50)
+    # Parsed from `mileage` on save (core/mileage.py); None if unreadable
+    mileage_km = models.PositiveIntegerField(null=True, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to="cars/", blank=True, null=True)
     description = models.TextField(blank=True)
+    # Resized copies of `image`, maintained by core/images.py
+    image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_READY, editable=False
+    )
+    image_hash = models.CharField(max_length=16, blank=True, editable=False)
+    image_source = models.CharField(max_length=100, blank=True, editable=False)
+    # Denormalized from Review, maintained by core/ratings.py
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped by save(), core/images.py and core/ratings.py; drives the ETags
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.year})"
 
+    def save(self, *args, **kwargs):
+        self.mileage_km = parse_mileage(self.mileage)
+        if kwargs.get("update_fields") is not None and "mileage" in kwargs["update_fields"]:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "mileage_km"}
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ["-year", "name"]
+        ordering = ["-year", "name", "id"]
+        indexes = [
+            # Backs the keyset-paginated catalog (see CATALOG_ORDERING in views).
+            # The trailing price and mileage let a filtered walk skip rows
+            # without reading them, as in car_rating_idx.
+            models.Index(fields=["-year", "name", "id", "price", "mileage_km"], name="car_catalog_idx"),
+            # Backs sort=rating and min_rating (see RATING_ORDERING in views)
+            models.Index(fields=["-rating_avg", "id", "price", "mileage_km"], name="car_rating_idx"),
+            # Back sort=price and sort=mileage, and seek their range filters
+            # (see CATALOG_SORTS in views); year ranges use car_catalog_idx
+            models.Index(fields=["price", "id"], name="car_price_idx"),
+            models.Index(fields=["mileage_km", "id"], name="car_mileage_idx"),
+            models.Index(fields=["transmission", "-year", "name", "id"], name="car_transmission_catalog_idx"),
+            # Backs the process_car_images worker's queue
+            models.Index(fields=["image_status"], name="car_image_status_idx"),
+            # Owner's fleet, and add_car's duplicate check on (owner, name, year)
+            models.Index(fields=["owner", "name", "year"], name="car_owner_name_year_idx"),
+            # An owner's storefront page, and its newest change (ETag)
+            models.Index(fields=["owner", "-year", "name", "id"], name="car_owner_catalog_idx"),
+            models.Index(fields=["owner", "-updated_at"], name="car_owner_updated_idx"),
+            # Newest change to the catalog (core.conditional validators)
+            models.Index(fields=["updated_at"], name="car_updated_idx"),
+        ]
 
 
 # =====================
@@ -71,14 +133,32 @@ class Booking(models.Model):
     STATUS_APPROVED = "approved"
     STATUS_REJECTED = "rejected"
     STATUS_PAID = "paid"
+    STATUS_EXPIRED = "expired"
 
     STATUS_CHOICES = [
         (STATUS_PENDING, "Pending"),
         (STATUS_APPROVED, "Approved"),
         (STATUS_REJECTED, "Rejected"),
         (STATUS_PAID, "Paid"),
+        (STATUS_EXPIRED, "Expired"),
     ]
 
+    # Status -> statuses it may move to. Paid, rejected and expired are final.
+    TRANSITIONS = {
+        STATUS_PENDING: (STATUS_APPROVED, STATUS_REJECTED, STATUS_EXPIRED),
+        STATUS_APPROVED: (STATUS_PAID, STATUS_REJECTED, STATUS_EXPIRED),
+        STATUS_PAID: (),
+        STATUS_REJECTED: (),
+        STATUS_EXPIRED: (),
+    }
+    # How long a booking may wait for the owner (pending) or for the payment
+    # (approved) while holding the car's dates; `manage.py expire_bookings`
+    # expires it afterwards.
+    HOLD_DURATIONS = {
+        STATUS_PENDING: timedelta(days=2),
+        STATUS_APPROVED: timedelta(days=1),
+    }
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -101,13 +181,116 @@ class Booking(models.Model):
     return_time = models.TimeField()
     special_request = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    status_changed_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    # End of the hold on the car's dates while pending/approved; None otherwise
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Quoted once at creation by core.pricing (see save()); never recomputed
+    days = models.PositiveIntegerField(default=1)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Signed rental agreement, stored by core.contracts
+    contract_file = models.CharField(max_length=255, blank=True, default="")
+    contract_signed_at = models.DateTimeField(null=True, blank=True)
+    # Latest Stripe Checkout Session; the success page looks the booking up by it
+    stripe_session_id = models.CharField(max_length=255, blank=True, default="")
     created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"Booking #{self.pk} - {self.user} → {self.car}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded values, so a save can tell what changed without
+        # reading the row again.
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @property
+    def original_status(self):
+        """Status as loaded from the database; None for unsaved bookings."""
+        return getattr(self, "_loaded_values", {}).get("status")
+
+    @classmethod
+    def sources(cls, status):
+        """Statuses a booking may move to `status` from."""
+        return tuple(source for source, targets in cls.TRANSITIONS.items() if status in targets)
+
+    @classmethod
+    def status_fields(cls, status, now=None):
+        """The fields to write when a booking enters `status`, e.g. for queryset.update()."""
+        now = now or timezone.now()
+        hold = cls.HOLD_DURATIONS.get(status)
+        return {
+            "status": status,
+            "status_changed_at": now,
+            "updated_at": now,
+            "expires_at": now + hold if hold else None,
+        }
+
+    def clean(self):
+        original = self.original_status
+        if original and self.status != original and self.status not in self.TRANSITIONS[original]:
+            raise ValidationError(
+                {"status": f"A {original} booking can't be moved to {self.status}."}
+            )
+
+    def save(self, *args, **kwargs):
+        original = self.original_status
+        if self._state.adding and not self.total_price and self.car_id:
+            # Every way in (reserve, the admin, a script) gets the same quote
+            pickup_date, return_date = (
+                self._meta.get_field(name).to_python(getattr(self, name)) for name in ("pickup_date", "return_date")
+            )
+            quote = pricing.quote(self.car.price, pickup_date, return_date)
+            self.days, self.total_price = quote.days, quote.total
+        if self._state.adding and self.expires_at is None and self.status in self.HOLD_DURATIONS:
+            self.expires_at = self.created_at + self.HOLD_DURATIONS[self.status]
+        elif original and self.status != original:
+            if self.status not in self.TRANSITIONS[original]:
+                raise ValidationError(f"Booking #{self.pk} can't move from {original} to {self.status}.")
+            for field, value in self.status_fields(self.status).items():
+                setattr(self, field, value)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "status_changed_at", "updated_at", "expires_at"}
+        super().save(*args, **kwargs)
+        self._loaded_values = {**getattr(self, "_loaded_values", {}), "status": self.status}
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Per-status counts and revenue on the owner dashboard
+            models.Index(fields=["car", "status"], name="booking_car_status_idx"),
+            # Holds to expire (manage.py expire_bookings)
+            models.Index(fields=["status", "expires_at"], name="booking_hold_expiry_idx"),
+            # A renter's bookings, newest first (my_bookings)
+            models.Index(fields=["user", "-created_at"], name="booking_user_recent_idx"),
+            models.Index(fields=["stripe_session_id"], name="booking_stripe_session_idx"),
+        ]
+
+
+# =====================
+# Car Occupancy
+# =====================
+class CarOccupancy(models.Model):
+    """
+    One row per car per booked day, maintained from active bookings by
+    core/availability.py. The unique (car, day) constraint is what makes a
+    double booking impossible, and doubles as the index for conflict checks.
+    """
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name="occupancy")
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name="occupancy")
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.car_id} booked on {self.day}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["car", "day"], name="car_occupancy_unique_day"),
+        ]
+
+
 # =====================
 # Review Model
 # =====================
@@ -126,12 +309,123 @@ class Review(models.Model):
     rating = models.PositiveIntegerField(default=5)  # من 1 إلى 5 مثلاً
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Review by {self.user} on {self.car}"
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # A car's reviews, newest first (detail page)
+            models.Index(fields=["car", "-created_at"], name="review_car_recent_idx"),
+        ]
+
+
+# =====================
+# Car Search Document
+# =====================
+class CarSearchDocument(models.Model):
+    """Denormalized, text-indexed copy of a car's searchable fields (see core/search.py)."""
+    car = models.OneToOneField(
+        Car, on_delete=models.CASCADE, primary_key=True, related_name="search_document"
+    )
+    body = models.TextField()
+    year = models.PositiveIntegerField()
+    transmission = models.CharField(max_length=20)
+
+    def __str__(self):
+        return f"Search document for {self.car_id}"
+
+
+# =====================
+# Owner Summary
+# =====================
+class OwnerSummary(models.Model):
+    """Denormalized fleet statistics per owner for the company directory (see core/owners.py)."""
+    owner = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    # Shown in the directory: an approved, active owner
+    listed = models.BooleanField(default=False)
+    name = models.CharField(max_length=160)
+    car_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Over all reviews of the owner's cars, from Car.rating_sum / review_count
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    booking_count = models.PositiveIntegerField(default=0)
+    # Last change to what the listings show; a new booking doesn't count
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary for {self.name}"
+
+    class Meta:
+        indexes = [
+            # One per sort of the companies page (see COMPANIES_SORTS in views)
+            models.Index(fields=["listed", "name", "owner"], name="owner_summary_name_idx"),
+            models.Index(fields=["listed", "-car_count", "owner"], name="owner_summary_fleet_idx"),
+            models.Index(fields=["listed", "-rating_avg", "owner"], name="owner_summary_rating_idx"),
+            models.Index(fields=["listed", "-booking_count", "owner"], name="owner_summary_bookings_idx"),
+            # Newest change to the directory (core.conditional validators)
+            models.Index(fields=["updated_at"], name="owner_summary_updated_idx"),
+        ]
+
+
+# =====================
+# Outbound Email Queue
+# =====================
+class OutboundEmail(models.Model):
+    """A queued email, written by core.outbox.enqueue and sent by `manage.py send_queued_mail`."""
+    STATUS_QUEUED = "queued"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        # Claimed by a worker until next_attempt_at (see core.outbox.claim)
+        (STATUS_SENDING, "Sending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    # [{"path": <default_storage name>, "filename": ..., "mimetype": ...}]
+    attachments = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.recipients)}"
+
+    class Meta:
+        ordering = ["next_attempt_at", "id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+
+# =====================
+# Processed Stripe Events
+# =====================
+class ProcessedStripeEvent(models.Model):
+    """A webhook event core.payments has already applied; Stripe delivers at least once."""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    processed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
 
 
 # =====================
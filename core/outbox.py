@@ -0,0 +1,156 @@
+"""
+Outbound email queue.
+
+Views never talk to SMTP. They call enqueue(), which stores an
+OutboundEmail row once the surrounding transaction commits, so a rolled-back
+request sends nothing. `manage.py send_queued_mail` drains the queue in
+batches over a single SMTP connection and retries failures with
+exponential backoff.
+
+A batch is claimed in a short transaction that marks its rows "sending"
+and leases them until now + SEND_LEASE. The SMTP conversation happens
+after that commit, so no row lock is held while mail goes out, and the
+results are recorded in a second short write. Rows left "sending" by a
+worker that died are due again once their lease runs out. Only the
+holder of a lease records a result, so a worker that outlived its lease
+can't overwrite the one that took over.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import OutboundEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=1)
+SEND_LEASE = timedelta(minutes=10)
+
+
+def _build(subject, message, recipient_list, from_email=None, attachments=()):
+    return OutboundEmail(
+        subject=subject[:255],
+        body=message,
+        from_email=from_email or "",
+        recipients=[r for r in recipient_list if r],
+        attachments=list(attachments),
+    )
+
+
+def _queue(rows):
+    rows = [row for row in rows if row.recipients]
+    if rows:
+        transaction.on_commit(lambda: OutboundEmail.objects.bulk_create(rows))
+
+
+def enqueue(subject, message, recipient_list, from_email=None, attachments=()):
+    """
+    Queue one email; same argument order as django.core.mail.send_mail.
+    `attachments` are dicts with the storage "path" of a file, plus its
+    "filename" and "mimetype". The file is read when the email is sent.
+    """
+    _queue([_build(subject, message, recipient_list, from_email, attachments)])
+
+
+def enqueue_many(datatuple):
+    """Queue many emails with a single INSERT; tuples as for send_mass_mail."""
+    _queue([_build(subject, message, recipients, from_email)
+            for subject, message, from_email, recipients in datatuple])
+
+
+def _message(email, smtp):
+    message = EmailMessage(
+        email.subject,
+        email.body,
+        email.from_email or settings.DEFAULT_FROM_EMAIL,
+        email.recipients,
+        connection=smtp,
+    )
+    for attachment in email.attachments:
+        with default_storage.open(attachment["path"], "rb") as f:
+            message.attach(attachment["filename"], f.read(), attachment.get("mimetype"))
+    return message
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def claim(batch_size, now=None):
+    """
+    Lease up to `batch_size` due emails to this worker. Returns them with
+    next_attempt_at set to the lease's expiry.
+    """
+    now = now or timezone.now()
+    lease_until = now + SEND_LEASE
+    due = OutboundEmail.objects.filter(
+        status__in=[OutboundEmail.STATUS_QUEUED, OutboundEmail.STATUS_SENDING], next_attempt_at__lte=now
+    )
+    with transaction.atomic():
+        candidates = due.order_by("next_attempt_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the queue without sending twice.
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list("pk", flat=True)[:batch_size])
+        # Re-check due-ness in the UPDATE for databases without row locks.
+        due.filter(pk__in=ids).update(status=OutboundEmail.STATUS_SENDING, next_attempt_at=lease_until)
+    return list(
+        OutboundEmail.objects.filter(
+            pk__in=ids, status=OutboundEmail.STATUS_SENDING, next_attempt_at=lease_until
+        ).order_by("id")
+    )
+
+
+def _record(sent, failed, now):
+    for email, error in failed:
+        attempts = email.attempts + 1
+        OutboundEmail.objects.filter(
+            pk=email.pk, status=OutboundEmail.STATUS_SENDING, next_attempt_at=email.next_attempt_at
+        ).update(
+            attempts=attempts,
+            last_error=str(error)[:1000],
+            status=OutboundEmail.STATUS_FAILED if attempts >= MAX_ATTEMPTS else OutboundEmail.STATUS_QUEUED,
+            next_attempt_at=now + backoff(attempts),
+        )
+    if sent:
+        # One lease per batch, so the sent rows share next_attempt_at.
+        OutboundEmail.objects.filter(
+            pk__in=[email.pk for email in sent],
+            status=OutboundEmail.STATUS_SENDING,
+            next_attempt_at=sent[0].next_attempt_at,
+        ).update(status=OutboundEmail.STATUS_SENT, sent_at=timezone.now(), last_error="")
+
+
+def send_batch(batch_size=100):
+    """
+    Send up to `batch_size` due emails over one SMTP connection.
+    Returns (sent, failed) counts.
+    """
+    now = timezone.now()
+    batch = claim(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent, failed = [], []
+    try:
+        with get_connection() as smtp:
+            for email in batch:
+                try:
+                    message = _message(email, smtp)
+                    with metrics.external("smtp"):
+                        message.send()
+                    sent.append(email)
+                except Exception as e:
+                    failed.append((email, e))
+    except Exception as e:
+        # Could not open (or cleanly close) the connection.
+        done = {email.pk for email in sent}
+        failed = [(email, e) for email in batch if email.pk not in done]
+
+    _record(sent, failed, now)
+    return len(sent), len(failed)
@@ -0,0 +1,127 @@
+"""
+Owner accounts.
+
+approve() activates pending owner accounts in chunks. Each chunk is one
+UPDATE and one outbox INSERT for the welcome emails, in its own
+transaction. A large selection therefore never holds one long
+transaction, and a failure part-way keeps the chunks already done.
+queryset.update() skips the post_save signals, so the page caches and
+the directory flag are updated here.
+
+Each owner also has an OwnerSummary row: car count, price range, rating
+and booking volume, kept current by the signals in core/signals.py. The
+companies page and the homepage read these rows directly instead of
+aggregating over Car and Booking per owner. `manage.py
+rebuild_owner_summaries` recomputes every row if they ever drift.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.utils import timezone
+
+from . import caching, outbox, ratings
+from .models import Booking, Car, OwnerSummary, User
+
+CHUNK_SIZE = 500
+
+APPROVED_SUBJECT = "✅ Account Approved"
+APPROVED_MESSAGE = (
+    "Hello {username},\n\n"
+    "Your owner account has been approved by the admin.\n"
+    "You can now log in and start adding your cars.\n\n"
+    "Best regards,\nRoyal Cars Team"
+)
+
+
+def pending(queryset):
+    return queryset.filter(role="owner", is_approved=False)
+
+
+def approve(queryset, chunk_size=None):
+    """
+    Approve the pending owners in `queryset`, yielding (approved so far,
+    total) after each chunk of `chunk_size` (default CHUNK_SIZE).
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    ids = list(pending(queryset).order_by("pk").values_list("pk", flat=True))
+    done = 0
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        with transaction.atomic():
+            # Re-check the flag, so owners approved meanwhile are not emailed twice.
+            owners = list(
+                pending(User.objects.select_for_update().filter(pk__in=chunk)).values_list("pk", "username", "email")
+            )
+            if owners:
+                User.objects.filter(pk__in=[pk for pk, _, _ in owners]).update(is_approved=True, is_active=True)
+                OwnerSummary.objects.filter(owner_id__in=[pk for pk, _, _ in owners]).update(
+                    listed=True, updated_at=timezone.now()
+                )
+                outbox.enqueue_many([
+                    (APPROVED_SUBJECT, APPROVED_MESSAGE.format(username=username), None, [email])
+                    for _, username, email in owners
+                ])
+                caching.invalidate("owners", *(f"owner:{pk}" for pk, _, _ in owners))
+        done += len(owners)
+        yield done, len(ids)
+
+
+# ===========================
+# DIRECTORY SUMMARY
+# ===========================
+def fleet_stats(owner_id):
+    """The OwnerSummary columns derived from `owner_id`'s cars and their bookings."""
+    fleet = Car.objects.filter(owner_id=owner_id).aggregate(
+        car_count=Count("id"),
+        min_price=Min("price"),
+        max_price=Max("price"),
+        rating_sum=Sum("rating_sum"),
+        review_count=Sum("review_count"),
+    )
+    review_count = fleet["review_count"] or 0
+    return {
+        "car_count": fleet["car_count"],
+        "min_price": fleet["min_price"] or 0,
+        "max_price": fleet["max_price"] or 0,
+        "rating_avg": ratings.average(fleet["rating_sum"] or 0, review_count),
+        "review_count": review_count,
+        "booking_count": Booking.objects.filter(car__owner_id=owner_id).count(),
+    }
+
+
+def sync_summary(owner):
+    """Create or update `owner`'s summary from the account itself (name, listed)."""
+    if owner.role != "owner":
+        OwnerSummary.objects.filter(owner=owner, listed=True).update(listed=False, updated_at=timezone.now())
+        return
+    _, created = OwnerSummary.objects.update_or_create(owner=owner, defaults={
+        "name": owner.company_name or owner.username,
+        "listed": owner.is_approved and owner.is_active,
+    })
+    if created:
+        refresh_fleet(owner.pk)
+
+
+def refresh_fleet(owner_id):
+    """Recompute the fleet columns of `owner_id`'s summary after a car or review changed."""
+    if owner_id:
+        OwnerSummary.objects.filter(owner_id=owner_id).update(**fleet_stats(owner_id), updated_at=timezone.now())
+
+
+def refresh_car_owner(car_id):
+    refresh_fleet(Car.objects.filter(pk=car_id).values_list("owner_id", flat=True).first())
+
+
+def booking_added(booking):
+    # One UPDATE ... WHERE owner_id IN (owner of the car)
+    if booking.car_id:
+        OwnerSummary.objects.filter(owner__cars=booking.car_id).update(booking_count=F("booking_count") + 1)
+
+
+def rebuild_summaries():
+    """Recompute every owner's summary, one owner at a time. Returns the count."""
+    count = 0
+    for owner in User.objects.filter(role="owner").iterator():
+        sync_summary(owner)
+        refresh_fleet(owner.pk)
+        count += 1
+    return count
@@ -0,0 +1,124 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder cuts datetimes to milliseconds. A cursor needs them
+    exact, or `created_at < cursor` skips rows from the same millisecond.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(values, list):
+        raise InvalidCursor("Malformed cursor.")
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    Build the "row comes after `values`" condition for an ordering such as
+    ["-year", "name", "id"]:
+        year < y OR (year = y AND (name > n OR (name = n AND id > i)))
+    """
+    condition = None
+    for field, value in reversed(list(zip(ordering, values))):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        after = Q(**{f"{name}__{lookup}": value})
+        if condition is not None:
+            after |= Q(**{name: value}) & condition
+        condition = after
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+
+class KeysetPaginator:
+    """
+    Seek pagination: every page is `WHERE <after cursor> ORDER BY ... LIMIT n`,
+    so page N costs the same index range scan as page 1. The last field of
+    `ordering` must be unique (usually "id") to break ties.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    def _values(self, obj):
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def _coerce(self, values):
+        """The cursor's values as Python values of their ordering fields."""
+        if len(values) != len(self.ordering):
+            raise InvalidCursor("Cursor does not match this listing.")
+        coerced = []
+        for field, value in zip(self.ordering, values):
+            # keyset_filter compares with < and >, which never match NULL
+            if value is None or isinstance(value, (list, dict)):
+                raise InvalidCursor("Cursor does not match this listing.")
+            try:
+                model_field = self.queryset.model._meta.get_field(field.lstrip("-"))
+                value = model_field.to_python(value)
+                model_field.run_validators(value)
+            except (FieldDoesNotExist, ValidationError):
+                raise InvalidCursor("Cursor does not match this listing.")
+            coerced.append(value)
+        return coerced
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        if cursor:
+            values = self._coerce(decode_cursor(cursor))
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+
+        rows = list(queryset[: self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[: self.per_page]
+            next_cursor = encode_cursor(self._values(rows[-1]))
+        return KeysetPage(rows, next_cursor, cursor)
@@ -0,0 +1,278 @@
+"""
+Stripe payments: starting a checkout and reconciling the result.
+
+checkout() returns the Stripe Checkout URL for a booking. The API call
+goes through a PaymentGateway. StripeGateway keeps one pooled HTTP client
+for the whole process, with short timeouts. FakeGateway stays in memory,
+for tests and offline development. settings.PAYMENT_GATEWAY picks which
+one is used. Every session is created with an idempotency key derived from
+the booking, and its URL is cached per booking. Pressing "Pay" twice
+reuses the open session instead of creating a second one.
+
+Stripe tells us a booking was paid by POSTing a signed event to
+/payment/webhook/. The redirect back to /payment/success/ only reads
+local state, so a payment is recorded even if the renter never comes back.
+
+Stripe delivers events at least once. Every applied event is recorded in
+ProcessedStripeEvent in the same transaction as its effect, so a
+redelivered event is acknowledged without doing anything. If applying an
+event fails, the whole transaction rolls back and Stripe retries it.
+
+fake_event() and sign() build events the way Stripe does, for tests and
+for poking a local server without the Stripe CLI.
+"""
+import hashlib
+import hmac
+import json
+import time
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import images, metrics, outbox, pricing
+from .models import Booking, ProcessedStripeEvent
+
+CONNECT_TIMEOUT = 3  # seconds
+READ_TIMEOUT = 10
+MAX_NETWORK_RETRIES = 2  # safe: every create carries an idempotency key
+# Stripe keeps a Checkout Session open for 30 minutes to 24 hours. One is
+# reused for at most REUSE_WINDOW after it was created, and stays open
+# SESSION_LIFETIME past the end of that window (see session_expiry).
+SESSION_LIFETIME = 60 * 60
+REUSE_WINDOW = 30 * 60
+# An approved booking is held at least this long past its session's expiry,
+# so a late webhook for a paid session never finds it expired.
+HOLD_GRACE = timedelta(minutes=15)
+
+CheckoutSession = namedtuple("CheckoutSession", "id url")
+
+
+# ===========================
+# GATEWAYS
+# ===========================
+class StripeGateway:
+    """The real Stripe API, through one StripeClient per process."""
+
+    def __init__(self):
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY or "",
+            http_client=stripe.RequestsClient(timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)),
+            max_network_retries=MAX_NETWORK_RETRIES,
+        )
+
+    def create_checkout_session(self, params, idempotency_key):
+        with metrics.external("stripe"):
+            session = self.client.v1.checkout.sessions.create(
+                params=params, options={"idempotency_key": idempotency_key}
+            )
+        return CheckoutSession(session.id, session.url)
+
+
+class FakeGateway:
+    """
+    Keeps sessions in memory and never touches the network. Like Stripe, a
+    repeated idempotency key returns the session it created the first time,
+    and fails if it comes with different parameters.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.requests = []
+
+    def create_checkout_session(self, params, idempotency_key):
+        self.requests.append((params, idempotency_key))
+        if idempotency_key not in self.sessions:
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            self.sessions[idempotency_key] = (params, CheckoutSession(
+                session_id, f"https://checkout.stripe.test/pay/{session_id}"
+            ))
+        first_params, session = self.sessions[idempotency_key]
+        if params != first_params:
+            raise stripe.IdempotencyError(
+                "Keys for idempotent requests can only be used with the same parameters they were first used with."
+            )
+        return session
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def gateway():
+    """The process-wide gateway named by settings.PAYMENT_GATEWAY."""
+    global _gateway
+    with _gateway_lock:
+        path = settings.PAYMENT_GATEWAY
+        if _gateway is None or _gateway[0] != path:
+            _gateway = (path, import_string(path)())
+        return _gateway[1]
+
+
+# ===========================
+# CHECKOUT
+# ===========================
+def session_expiry(window):
+    """
+    Unix time a session created in REUSE_WINDOW number `window` expires: a
+    function of the window alone, so every create under one idempotency key
+    sends the same parameters. That is 60 to 90 minutes after creation.
+    """
+    return (window + 1) * REUSE_WINDOW + SESSION_LIFETIME
+
+
+def _checkout_params(booking, amount_cents, window):
+    car = booking.car
+    product = {
+        "name": f"{car.name} ({booking.days} day{'s' if booking.days != 1 else ''})",
+        "description": f"🚗 Pickup: {booking.pickup_location} → 🏁 Drop: {booking.drop_location}",
+    }
+    if car.image:
+        product["images"] = [f"{settings.DOMAIN}{images.rendition_url(car, 'card')}"]
+    return {
+        "mode": "payment",
+        "payment_method_types": ["card"],
+        "line_items": [{
+            "price_data": {"currency": "usd", "product_data": product, "unit_amount": amount_cents},
+            "quantity": 1,
+        }],
+        "metadata": {"booking_id": str(booking.pk), "user_id": str(booking.user_id)},
+        "expires_at": session_expiry(window),
+        "success_url": f"{settings.DOMAIN}{reverse('payment_success')}?session_id={{CHECKOUT_SESSION_ID}}",
+        "cancel_url": f"{settings.DOMAIN}{reverse('payment_cancel')}?booking={booking.pk}",
+    }
+
+
+def checkout(booking):
+    """
+    URL of an open Checkout Session charging the booking's quoted
+    total_price. An open session for the same amount is reused. Otherwise
+    one is created and recorded on the booking.
+
+    The idempotency key covers the booking, the amount and the current
+    REUSE_WINDOW. Two clicks that both miss the cache still get the same
+    session from Stripe, and a later click after the window gets a new one.
+    """
+    amount_cents = pricing.to_cents(booking.total_price)
+    window = int(time.time() // REUSE_WINDOW)
+    idempotency_key = f"booking-{booking.pk}-checkout-{amount_cents}-{window}"
+    cache_key = f"checkout:{booking.pk}"
+    cached = cache.get(cache_key)
+    if cached and cached[0] == amount_cents:
+        return cached[1].url
+
+    session = gateway().create_checkout_session(_checkout_params(booking, amount_cents, window), idempotency_key)
+    # Keep the dates held while the session can still be paid.
+    hold_until = datetime.fromtimestamp(session_expiry(window), tz=dt_timezone.utc) + HOLD_GRACE
+    Booking.objects.filter(
+        pk=booking.pk, status=Booking.STATUS_APPROVED, expires_at__lt=hold_until
+    ).update(expires_at=hold_until, updated_at=timezone.now())
+    if session.id != booking.stripe_session_id:
+        Booking.objects.filter(pk=booking.pk).update(stripe_session_id=session.id, updated_at=timezone.now())
+        booking.stripe_session_id = session.id
+    # Stripe may hand back a session made earlier in this window, so keep
+    # it only until the window ends.
+    cache.set(cache_key, (amount_cents, session), (window + 1) * REUSE_WINDOW - time.time())
+    return session.url
+
+
+# ===========================
+# WEBHOOK
+# ===========================
+# Events that mean the Checkout Session has been paid. "completed" also
+# fires for delayed methods (bank debits) before the money arrives, with
+# payment_status "unpaid"; those are paid later by async_payment_succeeded.
+PAID_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+
+def construct_event(payload, signature):
+    """
+    Verify the Stripe-Signature header and parse the event into a plain
+    dict. Raises ValueError for a malformed payload and
+    stripe.SignatureVerificationError for a bad or missing signature.
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise stripe.SignatureVerificationError("STRIPE_WEBHOOK_SECRET is not set", signature)
+    event = stripe.Webhook.construct_event(payload, signature or "", settings.STRIPE_WEBHOOK_SECRET)
+    return event.to_dict()
+
+
+def handle_event(event):
+    """
+    Apply `event` once. Returns False if it was already processed.
+    Event types we don't act on are recorded too, so they are never retried.
+    """
+    with transaction.atomic():
+        _, created = ProcessedStripeEvent.objects.get_or_create(
+            event_id=event["id"], defaults={"type": event["type"]}
+        )
+        if not created:
+            return False
+        if event["type"] in PAID_EVENTS:
+            session = event["data"]["object"]
+            if session.get("payment_status") == "paid":
+                mark_paid(session)
+    return True
+
+
+def mark_paid(session):
+    """
+    Move the session's booking from approved to paid. The status check is
+    part of the UPDATE, so concurrent deliveries can't both send the email.
+    """
+    booking_id = (session.get("metadata") or {}).get("booking_id")
+    if not booking_id:
+        return False
+    updated = Booking.objects.filter(pk=booking_id, status__in=Booking.sources(Booking.STATUS_PAID)).update(
+        **Booking.status_fields(Booking.STATUS_PAID), stripe_session_id=session["id"]
+    )
+    if not updated:
+        return False
+
+    booking = Booking.objects.select_related("user", "car").get(pk=booking_id)
+    outbox.enqueue(
+        "✅ Payment Successful - Royal Cars",
+        f"Hello {booking.user.username},\n\nYour payment for {booking.car.name} was successful! Your booking is now marked as paid.",
+        [booking.user.email],
+        "noreply@royalcars.com",
+    )
+    return True
+
+
+# ===========================
+# FAKE EVENTS
+# ===========================
+def fake_event(booking, event_type="checkout.session.completed", payment_status="paid", session_id=None):
+    """An event shaped like Stripe's for a Checkout Session paying `booking`."""
+    return {
+        "id": f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {
+            "object": {
+                "id": session_id or booking.stripe_session_id or f"cs_test_{uuid.uuid4().hex}",
+                "object": "checkout.session",
+                "mode": "payment",
+                "payment_status": payment_status,
+                "metadata": {"booking_id": str(booking.pk), "user_id": str(booking.user_id)},
+            }
+        },
+    }
+
+
+def sign(event, secret=None, timestamp=None):
+    """Serialize `event` and sign it like Stripe. Returns (payload, Stripe-Signature header)."""
+    secret = secret or settings.STRIPE_WEBHOOK_SECRET
+    timestamp = int(timestamp or time.time())
+    payload = json.dumps(event)
+    digest = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, f"t={timestamp},v1={digest}"
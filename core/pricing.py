@@ -0,0 +1,56 @@
+"""
+Booking prices.
+
+A booking is charged once per rented day, over the same half-open range
+[pickup_date, return_date) that core.availability reserves. A same-day
+rental still counts as one day. Each day costs car.price times the
+multipliers that apply to it. WEEKEND_MULTIPLIER and SEASONS hold those
+multipliers and are neutral by default.
+
+quote() runs once, when the booking is created, and the result is stored
+on Booking.days / Booking.total_price. Everything after that (listings,
+dashboard revenue, checkout) reads the stored decimal, so a later change
+to the car's price or to the rate tables never reprices a booking.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+CENT = Decimal("0.01")
+WEEKEND_DAYS = (4, 5)  # Friday, Saturday
+WEEKEND_MULTIPLIER = Decimal("1")
+# (first day, last day, multiplier) as (month, day) pairs, inclusive. A
+# season may wrap around the new year, e.g. ((12, 15), (1, 5), Decimal("1.25")).
+SEASONS = []
+
+Quote = namedtuple("Quote", "days daily_rate total")
+
+
+def _in_season(day, start, end):
+    key = (day.month, day.day)
+    if start <= end:
+        return start <= key <= end
+    return key >= start or key <= end
+
+
+def day_multiplier(day):
+    multiplier = Decimal("1")
+    if day.weekday() in WEEKEND_DAYS:
+        multiplier *= WEEKEND_MULTIPLIER
+    for start, end, season_multiplier in SEASONS:
+        if _in_season(day, start, end):
+            multiplier *= season_multiplier
+    return multiplier
+
+
+def quote(daily_rate, pickup_date, return_date):
+    """Price of renting at `daily_rate` per day from pickup_date to return_date."""
+    daily_rate = Decimal(daily_rate)
+    days = [pickup_date + timedelta(days=i) for i in range(max((return_date - pickup_date).days, 1))]
+    total = sum((daily_rate * day_multiplier(day) for day in days), Decimal("0"))
+    return Quote(len(days), daily_rate, total.quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def to_cents(amount):
+    """A Decimal amount in the smallest currency unit, as Stripe wants it."""
+    return int((amount * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
@@ -0,0 +1,123 @@
+"""
+Query-plan checks for tests.
+
+    with FullScanCheck() as check:
+        client.get("/car/")
+    assert not check.offenders, check.report()
+
+Every SELECT run inside the block is passed through EXPLAIN on the
+configured database. The check records the statements whose plan reads a
+whole table instead of going through an index. An ordered index walk cut
+short by LIMIT (keyset pagination) does not count as a full scan, as long
+as the index holds every column the WHERE clause tests on that table; a
+walk that has to fetch rows to filter them is as bad as a scan. Plans
+from SQLite, MySQL/MariaDB and PostgreSQL are understood.
+"""
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Tables that are small by construction, or only ever read whole on purpose.
+DEFAULT_IGNORED = {"django_content_type", "django_migrations", "django_site"}
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(.*)$")
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+# Django aliases tables in subqueries and self-joins: "core_car" U0, ... T4
+_ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([UT]\d+)\b')
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+# "core_car"."price" or U0."price"
+_COLUMN = re.compile(r'(?:"(\w+)"|\b([UT]\d+))\."(\w+)"')
+
+
+def explain(sql):
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _filtered_columns(sql, table):
+    """Columns of `table` (a name or alias) that `sql` tests after its first WHERE."""
+    where = _WHERE.search(sql)
+    if not where:
+        return set()
+    return {column for name, alias, column in _COLUMN.findall(sql[where.end():]) if (name or alias) == table}
+
+
+def _sqlite_pragma(pragma, name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {pragma}("{name}")')
+        return cursor.fetchall()
+
+
+def _sqlite_pure_walk(sql, name, table, how):
+    """
+    True if the index walk in `how` answers every WHERE test on `table`
+    (`name` being how the plan and the SQL refer to it). Every SQLite index
+    entry also carries the rowid, i.e. an INTEGER PRIMARY KEY column.
+    """
+    columns = {row[1] for row in _sqlite_pragma("table_info", table) if row[5] and row[2].upper() == "INTEGER"}
+    match = _SQLITE_INDEX.search(how)
+    if match:
+        columns |= {row[2] for row in _sqlite_pragma("index_info", match.group(1))}
+    elif "INTEGER PRIMARY KEY" not in how:
+        return False
+    return _filtered_columns(sql, name) <= columns
+
+
+def _sqlite_scans(sql, plan):
+    aliases = dict((alias, table) for table, alias in _ALIAS.findall(sql))
+    limited = bool(_LIMIT.search(sql))
+    tables = []
+    for row in plan:
+        match = _SQLITE_SCAN.match(row["detail"])
+        if not match or match.group(1) == "CONSTANT":
+            continue
+        how = match.group(2)
+        if "VIRTUAL TABLE" in how:
+            continue  # FTS and friends do their own lookups
+        table = aliases.get(match.group(1), match.group(1))
+        if "USING" in how and limited and _sqlite_pure_walk(sql, match.group(1), table, how):
+            continue  # walking an index in order, stopped by LIMIT
+        tables.append(table)
+    return tables
+
+
+def scanned_tables(sql):
+    """Tables that `sql` reads in full, according to EXPLAIN."""
+    plan = explain(sql)
+    if connection.vendor == "sqlite":
+        return _sqlite_scans(sql, plan)
+    if connection.vendor == "mysql":
+        return [row["table"] for row in plan if row.get("type") == "ALL"]
+    if connection.vendor == "postgresql":
+        return [t for row in plan for t in _POSTGRES_SCAN.findall(row["QUERY PLAN"])]
+    return []
+
+
+class FullScanCheck(CaptureQueriesContext):
+    """Collects (sql, tables) for every captured SELECT that does a full scan."""
+
+    def __init__(self, ignored=DEFAULT_IGNORED):
+        super().__init__(connection)
+        self.ignored = set(ignored)
+        self.offenders = []
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        for query in self.captured_queries:
+            sql = query["sql"]
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            tables = [t for t in scanned_tables(sql) if t not in self.ignored]
+            if tables:
+                self.offenders.append((sql, tables))
+
+    def report(self):
+        return "\n\n".join(f"Full scan of {', '.join(tables)}:\n{sql}" for sql, tables in self.offenders)
@@ -0,0 +1,74 @@
+"""
+Car rating summary (Car.rating_avg / Car.review_count).
+
+New and deleted reviews adjust an exact running sum and count under a row
+lock and derive the average from them, so listings never aggregate over
+Review. `manage.py rebuild_ratings` recomputes every car in one UPDATE if
+the numbers ever drift.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Car, Review
+
+TWO_PLACES = Decimal("0.01")
+
+
+def average(total, count):
+    if not count:
+        return Decimal(0)
+    return (Decimal(total) / count).quantize(TWO_PLACES, ROUND_HALF_UP)
+
+
+def _apply(car_id, rating, delta):
+    with transaction.atomic():
+        car = (
+            Car.objects.select_for_update()
+            .only("rating_sum", "review_count")
+            .filter(pk=car_id)
+            .first()
+        )
+        if car is None:
+            return
+        count = max(car.review_count + delta, 0)
+        total = max(car.rating_sum + delta * rating, 0) if count else 0
+        # update() rather than save(): the car's listing data hasn't changed,
+        # so there is nothing for the Car post_save handlers to do.
+        Car.objects.filter(pk=car_id).update(
+            rating_sum=total, review_count=count, rating_avg=average(total, count), updated_at=timezone.now()
+        )
+
+
+def review_added(review):
+    _apply(review.car_id, review.rating, +1)
+
+
+def review_removed(review):
+    _apply(review.car_id, review.rating, -1)
+
+
+def refresh_car(car_id):
+    summary = Review.objects.filter(car_id=car_id).aggregate(total=Sum("rating"), count=Count("id"))
+    total = summary["total"] or 0
+    Car.objects.filter(pk=car_id).update(
+        rating_sum=total, review_count=summary["count"], rating_avg=average(total, summary["count"]),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild():
+    reviews = Review.objects.filter(car=OuterRef("pk")).order_by().values("car")
+    return Car.objects.update(
+        review_count=Coalesce(Subquery(reviews.annotate(n=Count("id")).values("n")), Value(0)),
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum("rating")).values("total")), Value(0)),
+        rating_avg=Coalesce(
+            Subquery(reviews.annotate(avg=Avg("rating")).values("avg")),
+            Value(Decimal(0)),
+            output_field=Car._meta.get_field("rating_avg"),
+        ),
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,196 @@
+"""
+Full-text search over cars.
+
+Every Car has a denormalized CarSearchDocument row (kept in sync by the
+signals in core/signals.py). The text itself is indexed by the database:
+an FTS5 virtual table on SQLite, a FULLTEXT index on MySQL (both created by
+migration 0007). Other backends fall back to LIKE over the document table.
+"""
+import re
+
+from django.db import connection
+
+from .models import Car, CarSearchDocument
+
+FTS_TABLE = "core_carsearch_fts"
+MAX_TERMS = 8
+# InnoDB's defaults (innodb_ft_min_token_size and its built-in stopword
+# list). Such words are never indexed, so they can't be required.
+MYSQL_MIN_TOKEN_SIZE = 3
+MYSQL_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or "
+    "that the this to was what when where who will with und www".split()
+)
+
+
+class SearchResults:
+    def __init__(self, cars, total, facets):
+        self.cars = cars
+        self.total = total
+        self.facets = facets
+
+
+def build_body(car):
+    company = car.owner.company_name if car.owner else ""
+    parts = [
+        car.name,
+        car.description,
+        company,
+        str(car.year),
+        car.transmission,
+        car.get_transmission_display(),
+    ]
+    return " ".join(p for p in parts if p)
+
+
+def tokenize(query):
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+# ===========================
+# BACKENDS
+# ===========================
+class LikeBackend:
+    """Portable fallback: unranked substring match over the document table."""
+    from_sql = "core_carsearchdocument d"
+
+    def index(self, cursor, car_id, body):
+        pass
+
+    def remove(self, cursor, car_id):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+    def where(self, terms):
+        sql = " AND ".join(["LOWER(d.body) LIKE %s"] * len(terms))
+        return sql, [f"%{t}%" for t in terms]
+
+    def rank(self, terms):
+        return "0", []
+
+
+class SqliteBackend(LikeBackend):
+    from_sql = f"core_carsearchdocument d JOIN {FTS_TABLE} f ON f.rowid = d.car_id"
+
+    def index(self, cursor, car_id, body):
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [car_id])
+        cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)", [car_id, body])
+
+    def remove(self, cursor, car_id):
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [car_id])
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def where(self, terms):
+        # Every term must match; the last one as a prefix for typeahead.
+        quoted = ['"%s"' % t for t in terms]
+        quoted[-1] += "*"
+        return f"{FTS_TABLE} MATCH %s", [" ".join(quoted)]
+
+    def rank(self, terms):
+        return f"bm25({FTS_TABLE})", []
+
+
+class MySQLBackend(LikeBackend):
+    # The FULLTEXT index lives on the document table itself, so there is
+    # nothing to maintain beyond the CarSearchDocument row.
+    match_sql = "MATCH (d.body) AGAINST (%s IN BOOLEAN MODE)"
+
+    def _required(self, term):
+        return len(term) >= MYSQL_MIN_TOKEN_SIZE and term not in MYSQL_STOPWORDS
+
+    def _expression(self, terms):
+        # Every indexable term is required (+); the rest only add to the
+        # rank, or a single "of" would make the whole search match nothing.
+        return " ".join(f"+{t}" if self._required(t) else t for t in terms) + "*"
+
+    def where(self, terms):
+        return self.match_sql, [self._expression(terms)]
+
+    def rank(self, terms):
+        return f"-{self.match_sql}", [self._expression(terms)]
+
+
+def get_backend(vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == "sqlite":
+        return SqliteBackend()
+    if vendor == "mysql":
+        return MySQLBackend()
+    return LikeBackend()
+
+
+# ===========================
+# INDEXING
+# ===========================
+def index_car(car):
+    body = build_body(car)
+    CarSearchDocument.objects.update_or_create(
+        car=car,
+        defaults={"body": body, "year": car.year, "transmission": car.transmission},
+    )
+    with connection.cursor() as cursor:
+        get_backend().index(cursor, car.pk, body)
+
+
+def remove_car(car_id):
+    CarSearchDocument.objects.filter(car_id=car_id).delete()
+    with connection.cursor() as cursor:
+        get_backend().remove(cursor, car_id)
+
+
+def reindex_owner(owner):
+    for car in Car.objects.filter(owner=owner).select_related("owner"):
+        index_car(car)
+
+
+def rebuild():
+    CarSearchDocument.objects.all().delete()
+    with connection.cursor() as cursor:
+        get_backend().clear(cursor)
+
+    count = 0
+    for car in Car.objects.select_related("owner").iterator(chunk_size=500):
+        index_car(car)
+        count += 1
+    return count
+
+
+# ===========================
+# QUERYING
+# ===========================
+def search(query, limit=20, offset=0):
+    """
+    Ranked prefix search. Returns one page of cars plus the total and
+    per-year / per-transmission counts for the whole match set.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return SearchResults([], 0, {"year": {}, "transmission": {}})
+
+    backend = get_backend()
+    where_sql, where_params = backend.where(terms)
+    rank_sql, rank_params = backend.rank(terms)
+    base = f"FROM {backend.from_sql} WHERE {where_sql}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT d.car_id {base} ORDER BY {rank_sql}, d.car_id LIMIT %s OFFSET %s",
+            where_params + rank_params + [limit, offset],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+        facets = {}
+        for field in ("year", "transmission"):
+            cursor.execute(f"SELECT d.{field}, COUNT(*) {base} GROUP BY d.{field}", where_params)
+            facets[field] = {value: count for value, count in cursor.fetchall()}
+
+    cars = Car.objects.in_bulk(ids)
+    return SearchResults(
+        [cars[i] for i in ids if i in cars],
+        sum(facets["year"].values()),
+        facets,
+    )
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
+from . import availability, caching, owners, ratings, search
+from .models import Booking, Car, Review
+
 @receiver(post_migrate)
 def create_default_admin(sender, **kwargs):
     User = get_user_model()
@@ -13,4 +16,132 @@ def create_default_admin(sender, **kwargs):
                 password="admin",
                 role="admin"
             )
-            print("✅ Default admin created (username=admin, password=admin)")
\ No newline at end of file
+            print("✅ Default admin created (username=admin, password=admin)")
+
+
+# ===========================
+# SEARCH INDEX
+# ===========================
+@receiver(post_save, sender=Car)
+def index_car(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_car(instance)
+
+
+@receiver(post_delete, sender=Car)
+def unindex_car(sender, instance, **kwargs):
+    search.remove_car(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def reindex_owner_cars(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins save only last_login; only the company name feeds the index.
+    if raw or instance.role != "owner":
+        return
+    if update_fields is not None and "company_name" not in update_fields:
+        return
+    search.reindex_owner(instance)
+
+
+# ===========================
+# IMAGE RENDITIONS
+# ===========================
+@receiver(pre_save, sender=Car)
+def queue_image_processing(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A new upload (from any form, including the admin) is handed to the
+    # process_car_images worker instead of being resized in the request.
+    if raw or update_fields is not None:
+        return
+    if instance.image and instance.image.name != instance.image_source:
+        instance.image_status = Car.IMAGE_PENDING
+
+
+# ===========================
+# AVAILABILITY
+# ===========================
+@receiver(post_save, sender=Booking)
+def sync_booking_occupancy(sender, instance, raw=False, **kwargs):
+    if not raw:
+        availability.sync_occupancy(instance)
+
+
+# ===========================
+# RATINGS
+# ===========================
+@receiver(post_save, sender=Review)
+def add_review_to_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        ratings.review_added(instance)
+    else:
+        ratings.refresh_car(instance.car_id)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating(sender, instance, **kwargs):
+    ratings.review_removed(instance)
+
+
+# ===========================
+# PAGE CACHE
+# ===========================
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_car_pages(sender, instance, **kwargs):
+    caching.invalidate_car(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_pages(sender, instance, **kwargs):
+    # The rating summary on the car changed too (see ratings above).
+    caching.invalidate_car(instance.car_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_owner_pages(sender, instance, update_fields=None, **kwargs):
+    if instance.role != "owner":
+        return
+    if update_fields is not None and update_fields <= {"last_login"}:
+        return
+    caching.invalidate_owner(instance.pk)
+
+
+# ===========================
+# OWNER SUMMARY
+# ===========================
+# Registered after RATINGS, so a review's car rating is already updated.
+@receiver(post_save, sender=get_user_model())
+def sync_owner_summary(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and update_fields <= {"last_login"}):
+        return
+    owners.sync_summary(instance)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def refresh_owner_fleet(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The image worker saves only its own fields.
+    if raw or (update_fields is not None and not {"owner", "price"} & set(update_fields)):
+        return
+    owners.refresh_fleet(instance.owner_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_owner_rating(sender, instance, raw=False, **kwargs):
+    if not raw:
+        owners.refresh_car_owner(instance.car_id)
+
+
+@receiver(post_save, sender=Booking)
+def count_owner_booking(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        owners.booking_added(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def recount_owner_bookings(sender, instance, **kwargs):
+    owners.refresh_car_owner(instance.car_id)
@@ -0,0 +1,41 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def car_picture(car, rendition="card", sizes=None, **attrs):
+    """
+    <picture> for a car's image: WebP with a JPEG fallback, each offered at
+    every rendition width so the browser picks the smallest that fits.
+
+        {% car_picture car "card" sizes="(max-width: 991px) 50vw, 33vw" class="img-fluid" %}
+    """
+    if not car.image:
+        return ""
+    attrs.setdefault("alt", car.name)
+    attrs.setdefault("loading", "lazy")
+    attrs.setdefault("decoding", "async")
+    if not images.has_renditions(car):
+        # Still queued for the worker (or unusable): show the placeholder.
+        return format_html('<img src="{}"{}>', images.rendition_url(car, rendition), flatatt(attrs))
+    sizes = sizes or f"{images.RENDITIONS[rendition]}px"
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        images.srcset(car, "webp"),
+        sizes,
+        images.rendition_url(car, rendition, "jpeg"),
+        images.srcset(car, "jpeg"),
+        sizes,
+        flatatt(attrs),
+    )
+
+
+@register.simple_tag
+def car_image_url(car, rendition="card", fmt="jpeg"):
+    return images.rendition_url(car, rendition, fmt)
@@ -1,3 +1,1426 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+import stripe
+from PIL import Image
+from django.apps import apps as django_apps
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.templatetags.static import static
+from django.utils import timezone
+
+from . import availability, benchmark, caching, conditional, dashboard, images, metrics, mileage, outbox, owners, payments, pricing, queryplan, search, transitions, views
+from .models import Booking, Car, CarOccupancy, OutboundEmail, OwnerSummary, ProcessedStripeEvent, Review, User
+from .pagination import encode_cursor
+from .queryplan import FullScanCheck
+
+
+def make_car(owner=None, **fields):
+    owner = owner or User.objects.create_user("owner", role="owner", is_approved=True)
+    defaults = {"name": "Camry", "year": 2024, "transmission": "AUTO", "mileage": "10k", "price": 50}
+    defaults.update(fields)
+    return Car.objects.create(owner=owner, **defaults)
+
+
+def booking_form(car, pickup_date, return_date):
+    return {
+        "car": car.pk,
+        "pickup_location": "Airport",
+        "drop_location": "Downtown",
+        "pickup_date": pickup_date.isoformat(),
+        "pickup_time": "10:00",
+        "return_date": return_date.isoformat(),
+        "return_time": "10:00",
+    }
+
+
+class BookingAvailabilityTests(TestCase):
+    def setUp(self):
+        self.car = make_car()
+        self.renter = User.objects.create_user("renter")
+        self.client.force_login(self.renter)
+        self.start = date.today() + timedelta(days=10)
+
+    def book(self, offset, days):
+        pickup = self.start + timedelta(days=offset)
+        return self.client.post(reverse("booking"), booking_form(self.car, pickup, pickup + timedelta(days=days)))
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book(0, 3).status_code, 200)
+        self.assertEqual(self.book(2, 3).status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_return_day_is_free_for_next_pickup(self):
+        self.assertEqual(self.book(0, 3).status_code, 200)
+        self.assertEqual(self.book(3, 2).status_code, 200)
+        self.assertEqual(CarOccupancy.objects.count(), 5)
+
+    def test_rejection_releases_days(self):
+        self.book(0, 3)
+        booking = Booking.objects.get()
+        booking.status = Booking.STATUS_REJECTED
+        booking.save()
+        self.assertFalse(CarOccupancy.objects.exists())
+        self.assertEqual(self.book(1, 1).status_code, 200)
+
+    def test_same_day_rental_holds_the_pickup_day(self):
+        self.assertEqual(self.book(0, 3).status_code, 200)
+        self.assertEqual(self.book(1, 0).status_code, 400)
+        self.assertEqual(self.book(3, 0).status_code, 200)
+        self.assertEqual(self.book(3, 1).status_code, 400)
+        self.assertEqual(CarOccupancy.objects.count(), 4)
+
+    def test_dates_out_of_range_are_rejected(self):
+        last = date.max
+        self.assertEqual(self.client.post(reverse("booking"), booking_form(self.car, last, last)).status_code, 400)
+        form = {**booking_form(self.car, self.start, self.start), "return_date": "soon"}
+        self.assertEqual(self.client.post(reverse("booking"), form).status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_occupancy_backfill_holds_same_day_rentals(self):
+        self.assertEqual(self.book(0, 0).status_code, 200)
+        CarOccupancy.objects.all().delete()
+        backfill = importlib.import_module("core.migrations.0008_car_occupancy")
+        backfill.occupy_active_bookings(django_apps, None)
+        self.assertEqual(list(CarOccupancy.objects.values_list("day", flat=True)), [self.start])
+
+    def test_checkout_reserves_through_availability(self):
+        self.book(0, 3)
+        pickup = self.start + timedelta(days=1)
+        request = RequestFactory().post("/", booking_form(self.car, pickup, pickup + timedelta(days=1)))
+        request.user = self.renter
+        response = views.create_checkout_session(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class PricingTests(TestCase):
+    def test_booking_stores_quote_for_every_day(self):
+        car = make_car(price=Decimal("49.99"))
+        self.client.force_login(User.objects.create_user("renter"))
+        pickup = date.today() + timedelta(days=10)
+        self.client.post(reverse("booking"), booking_form(car, pickup, pickup + timedelta(days=3)))
+        booking = Booking.objects.get()
+        self.assertEqual((booking.days, booking.total_price), (3, Decimal("149.97")))
+
+    def test_every_new_booking_is_quoted(self):
+        car = make_car(price=Decimal("20"))
+        pickup = date.today() + timedelta(days=10)
+        fields = {"car": car, "pickup_location": "A", "drop_location": "B", "pickup_time": "10:00", "return_time": "10:00"}
+        booking = Booking.objects.create(pickup_date=pickup, return_date=pickup + timedelta(days=2), **fields)
+        self.assertEqual((booking.days, booking.total_price), (2, Decimal("40.00")))
+        # An explicit price is kept, and a later save never reprices
+        agreed = Booking.objects.create(
+            pickup_date=pickup + timedelta(days=5), return_date=pickup + timedelta(days=7), days=2, total_price=15, **fields
+        )
+        car.price = 99
+        car.save()
+        agreed.save()
+        booking.refresh_from_db()
+        self.assertEqual((agreed.total_price, booking.total_price), (15, Decimal("40.00")))
+
+    def test_same_day_rental_is_one_day(self):
+        today = date.today()
+        self.assertEqual(pricing.quote(Decimal("50"), today, today), (1, Decimal("50"), Decimal("50.00")))
+
+    def test_weekend_and_season_multipliers(self):
+        friday = date(2026, 12, 4)
+        with mock.patch.object(pricing, "WEEKEND_MULTIPLIER", Decimal("1.5")), \
+                mock.patch.object(pricing, "SEASONS", [((12, 1), (1, 5), Decimal("2"))]):
+            # Thu (season) + Fri, Sat (weekend and season) + Sun (season)
+            quote = pricing.quote(Decimal("10"), friday - timedelta(days=1), friday + timedelta(days=3))
+        self.assertEqual(quote.total, Decimal("100.00"))
+
+
+class CatalogPagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        # Two cars per year, so pages split inside a run of equal years.
+        for i in range(7):
+            make_car(owner, name=f"Car {i}", year=2020 + i // 2, price=40 + i)
+        self.expected = list(Car.objects.order_by(*views.CATALOG_ORDERING).values_list("name", flat=True))
+
+    def walk(self, **params):
+        names, cursor = [], None
+        while True:
+            response = self.client.get(reverse("cars_api"), {**params, "limit": 3, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            names += [car["name"] for car in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                return names
+
+    def test_api_pages_cover_the_catalog_once_in_order(self):
+        self.assertEqual(self.walk(), self.expected)
+        by_rating = list(Car.objects.order_by(*views.RATING_ORDERING).values_list("name", flat=True))
+        self.assertEqual(self.walk(sort="rating"), by_rating)
+        by_price = list(Car.objects.order_by(*views.PRICE_ORDERING).values_list("name", flat=True))
+        self.assertEqual(self.walk(sort="price"), by_price)
+
+    def test_filters_keep_the_requested_order(self):
+        cheap = list(Car.objects.filter(price__lte=43).order_by(*views.CATALOG_ORDERING).values_list("name", flat=True))
+        self.assertEqual(self.walk(max_price=43), cheap)
+        self.assertEqual(self.walk(max_price=43, sort="bogus"), cheap)
+        response = self.client.get(reverse("car"), {"max_price": 43})
+        self.assertEqual(response.context["sort"], "newest")
+
+    def test_catalog_page_links_next_and_first(self):
+        with mock.patch.object(views, "CATALOG_PAGE_SIZE", 3):
+            first = self.client.get(reverse("car"))
+            self.assertEqual([c.name for c in first.context["page"]], self.expected[:3])
+            self.assertNotContains(first, "First page")
+            second = self.client.get(reverse("car"), {"cursor": first.context["page"].next_cursor})
+        self.assertEqual([c.name for c in second.context["page"]], self.expected[3:6])
+        self.assertContains(second, "First page")
+        self.assertContains(second, "Next page")
+
+    def test_tampered_cursor_is_rejected(self):
+        for values in [["abc", "x", 1], [None, None, None], [2020, ["x"], 1], [2020, "x"], [2020, "x", 10 ** 30]]:
+            cursor = encode_cursor(values)
+            self.assertEqual(self.client.get(reverse("cars_api"), {"cursor": cursor}).status_code, 400, values)
+            self.assertEqual(self.client.get(reverse("car"), {"cursor": cursor}).status_code, 404, values)
+        self.assertEqual(self.client.get(reverse("cars_api"), {"cursor": "%%%"}).status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True, company_name="Desert Wheels")
+
+    def names(self, query, **kwargs):
+        return [car.name for car in search.search(query, **kwargs).cars]
+
+    def test_last_term_matches_as_prefix(self):
+        make_car(self.owner, name="Camry Hybrid")
+        make_car(self.owner, name="Corolla")
+        self.assertEqual(self.names("cam"), ["Camry Hybrid"])
+        self.assertEqual(self.names("camry hyb"), ["Camry Hybrid"])
+        self.assertEqual(self.names("hyb camry"), [])
+
+    def test_closer_matches_rank_first(self):
+        make_car(self.owner, name="Roadster", description="A long road trip car that once belonged to a tesla fan club")
+        make_car(self.owner, name="Tesla Model 3", description="Tesla electric")
+        self.assertEqual(self.names("tesla"), ["Tesla Model 3", "Roadster"])
+
+    def test_limit_offset_and_facets(self):
+        for i in range(5):
+            make_car(self.owner, name=f"Civic {i}", year=2020 + i % 2, transmission=("AUTO", "MANUAL")[i % 3 == 0])
+        make_car(self.owner, name="Accord")
+        found = search.search("civic", limit=2, offset=0)
+        rest = search.search("civic", limit=10, offset=2)
+        self.assertEqual(len(found.cars), 2)
+        self.assertEqual(len(rest.cars), 3)
+        self.assertFalse({c.pk for c in found.cars} & {c.pk for c in rest.cars})
+        self.assertEqual(found.total, 5)
+        self.assertEqual(found.facets, {"year": {2020: 3, 2021: 2}, "transmission": {"AUTO": 3, "MANUAL": 2}})
+
+    def test_index_follows_car_and_owner_changes(self):
+        car = make_car(self.owner, name="Corolla")
+        self.assertEqual(self.names("desert"), ["Corolla"])
+        car.name = "Yaris"
+        car.save()
+        self.assertEqual(self.names("corolla"), [])
+        self.assertEqual(self.names("yaris"), ["Yaris"])
+        self.owner.company_name = "Oasis Rentals"
+        self.owner.save(update_fields=["company_name"])
+        self.assertEqual(self.names("desert"), [])
+        self.assertEqual(self.names("oasis"), ["Yaris"])
+        car.delete()
+        self.assertEqual(self.names("yaris"), [])
+
+    def test_search_api(self):
+        make_car(self.owner, name="Camry")
+        data = self.client.get(reverse("search_cars"), {"q": "cam"}).json()
+        self.assertEqual(([c["name"] for c in data["results"]], data["total"]), (["Camry"], 1))
+
+    def test_mysql_short_and_stop_words_are_optional(self):
+        backend = search.MySQLBackend()
+        self.assertEqual(backend._expression(["bmw", "of", "x5"]), "+bmw of x5*")
+        self.assertEqual(backend._expression(["toyota", "camry"]), "+toyota +camry*")
+
+
+class AvailableCarsApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        self.renter = User.objects.create_user("renter")
+        self.booked = make_car(owner, name="Booked", year=2024, price=80, transmission="AUTO")
+        self.manual = make_car(owner, name="Manual", year=2022, price=40, transmission="MANUAL")
+        self.auto = make_car(owner, name="Auto", year=2023, price=60, transmission="AUTO")
+        self.start = date.today() + timedelta(days=10)
+        availability.reserve(
+            self.booked, self.renter, self.start, self.start + timedelta(days=3),
+            pickup_location="A", drop_location="B", pickup_time="10:00", return_time="10:00",
+        )
+
+    def names(self, pickup_offset, days, **params):
+        pickup = self.start + timedelta(days=pickup_offset)
+        response = self.client.get(reverse("available_cars_api"), {
+            "pickup_date": pickup, "return_date": pickup + timedelta(days=days), **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [car["name"] for car in response.json()["results"]]
+
+    def test_overlap_is_half_open(self):
+        self.assertIn("Booked", self.names(-2, 2))  # returned on its pickup day
+        self.assertIn("Booked", self.names(3, 2))  # picked up on its return day
+        self.assertNotIn("Booked", self.names(-1, 2))
+        self.assertNotIn("Booked", self.names(2, 2))
+        self.assertNotIn("Booked", self.names(1, 0))  # same-day rental inside it
+
+    def test_filters(self):
+        self.assertEqual(self.names(20, 2, transmission="MANUAL"), ["Manual"])
+        self.assertEqual(self.names(20, 2, min_price=50, max_price=70), ["Auto"])
+        self.assertEqual(self.names(20, 2, min_year=2023), ["Booked", "Auto"])
+        self.assertEqual(self.names(0, 2, min_year=2023), ["Auto"])
+
+    def test_non_finite_numbers_are_rejected(self):
+        window = {"pickup_date": self.start, "return_date": self.start + timedelta(days=1)}
+        for param in ("min_price", "max_price", "min_rating"):
+            for value in ("NaN", "Infinity", "-inf", "sNaN"):
+                self.assertEqual(self.client.get(reverse("available_cars_api"), {**window, param: value}).status_code, 400)
+                self.assertEqual(self.client.get(reverse("cars_api"), {param: value}).status_code, 400)
+                self.assertEqual(self.client.get(reverse("car"), {param: value}).status_code, 404)
+
+    def test_bad_input_is_rejected(self):
+        url = reverse("available_cars_api")
+        self.assertEqual(self.client.get(url, {"pickup_date": "tomorrow"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"pickup_date": self.start, "return_date": self.start - timedelta(days=1)}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"pickup_date": self.start, "return_date": self.start, "max_price": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"pickup_date": date.max, "return_date": date.max}).status_code, 400)
+
+    def test_pages_follow_the_catalog_order(self):
+        pickup = self.start + timedelta(days=20)
+        params = {"pickup_date": pickup, "return_date": pickup + timedelta(days=1), "limit": 2}
+        first = self.client.get(reverse("available_cars_api"), params).json()
+        second = self.client.get(reverse("available_cars_api"), {**params, "cursor": first["next_cursor"]}).json()
+        self.assertEqual([c["name"] for c in first["results"]], ["Booked", "Auto"])
+        self.assertEqual(([c["name"] for c in second["results"]], second["next_cursor"]), (["Manual"], None))
+
+    def test_results_are_cached_for_the_ttl(self):
+        with mock.patch.object(caching.cache, "set", wraps=caching.cache.set) as cache_set:
+            self.assertIn("Auto", self.names(20, 2))
+        self.assertEqual(cache_set.call_args.args[2], views.AVAILABILITY_CACHE_TTL)
+        # A new booking doesn't invalidate the catalog; it shows once the entry expires.
+        availability.reserve(
+            self.auto, self.renter, self.start + timedelta(days=20), self.start + timedelta(days=22),
+            pickup_location="A", drop_location="B", pickup_time="10:00", return_time="10:00",
+        )
+        self.assertIn("Auto", self.names(20, 2))
+        cache.clear()
+        self.assertNotIn("Auto", self.names(20, 2))
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        self.renter = User.objects.create_user("renter")
+        self.camry = make_car(self.owner, name="Camry")
+        self.civic = make_car(self.owner, name="Civic")
+        self.other = make_car(User.objects.create_user("other", role="owner", is_approved=True), name="Other")
+        # June 2026 has 30 days; July 31.
+        for car, pickup, days, status, total in [
+            (self.camry, date(2026, 6, 1), 3, Booking.STATUS_PAID, "150.00"),
+            (self.camry, date(2026, 6, 29), 4, Booking.STATUS_PAID, "200.00"),  # 2 days in June, 2 in July
+            (self.civic, date(2026, 6, 10), 5, Booking.STATUS_PAID, "90.00"),
+            (self.civic, date(2026, 6, 20), 2, Booking.STATUS_REJECTED, "40.00"),
+            (self.civic, date(2026, 7, 5), 1, Booking.STATUS_PENDING, "20.00"),
+            (self.other, date(2026, 6, 1), 9, Booking.STATUS_PAID, "999.00"),
+        ]:
+            Booking.objects.create(
+                user=self.renter, car=car, pickup_location="A", drop_location="B",
+                pickup_date=pickup, pickup_time="10:00", return_date=pickup + timedelta(days=days),
+                return_time="10:00", status=status, days=days, total_price=Decimal(total),
+            )
+
+    def test_bookings_per_status(self):
+        with self.assertNumQueries(1):
+            counts = dict(dashboard.bookings_per_status(self.owner))
+        self.assertEqual(counts, {"Pending": 1, "Approved": 0, "Rejected": 1, "Paid": 3, "Expired": 0})
+
+    def test_revenue_per_car(self):
+        with self.assertNumQueries(1):
+            rows = list(dashboard.revenue_per_car(self.owner))
+        self.assertEqual(
+            [(r["car__name"], r["bookings"], r["revenue"]) for r in rows],
+            [("Camry", 2, Decimal("350.00")), ("Civic", 1, Decimal("90.00"))],
+        )
+
+    def test_utilization_per_month(self):
+        with self.assertNumQueries(1):
+            rows = dashboard.utilization_per_month(self.owner, 2, today=date(2026, 7, 15))
+        self.assertEqual(
+            [(r["month"], r["booked_days"], r["utilization"]) for r in rows],
+            [(date(2026, 6, 1), 10, round(100 * 10 / 60, 1)), (date(2026, 7, 1), 3, round(100 * 3 / 62, 1))],
+        )
+
+    def test_query_count_does_not_grow_with_the_fleet(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse("owner_dashboard"))
+        for i in range(5):
+            car = make_car(self.owner, name=f"Extra {i}")
+            pickup = date(2026, 8, 1) + timedelta(days=i)
+            Booking.objects.create(
+                user=self.renter, car=car, pickup_location="A", drop_location="B", pickup_date=pickup,
+                pickup_time="10:00", return_date=pickup + timedelta(days=1), return_time="10:00",
+                status=Booking.STATUS_PAID, days=1, total_price=Decimal("10.00"),
+            )
+        with self.assertNumQueries(len(small)):
+            response = self.client.get(reverse("owner_dashboard"))
+        self.assertEqual(response.status_code, 200)
+
+
+class RatingTests(TestCase):
+    def setUp(self):
+        self.car = make_car()
+        self.renter = User.objects.create_user("renter")
+
+    def review(self, rating, offset=0, car=None):
+        pickup = date.today() - timedelta(days=30 - 3 * offset)
+        booking = Booking.objects.create(
+            user=self.renter, car=car or self.car, pickup_location="A", drop_location="B",
+            pickup_date=pickup, pickup_time="10:00", return_date=pickup + timedelta(days=2),
+            return_time="10:00", status=Booking.STATUS_PAID,
+        )
+        return Review.objects.create(booking=booking, car=car or self.car, user=self.renter, rating=rating, comment="-")
+
+    def summary(self, car=None):
+        car = Car.objects.get(pk=(car or self.car).pk)
+        return car.rating_sum, car.review_count, car.rating_avg
+
+    def test_add_edit_and_delete_keep_the_summary_exact(self):
+        first = self.review(5, 0)
+        self.review(4, 1)
+        third = self.review(4, 2)
+        self.assertEqual(self.summary(), (13, 3, Decimal("4.33")))
+        first.rating = 2
+        first.save()
+        self.assertEqual(self.summary(), (10, 3, Decimal("3.33")))
+        third.delete()
+        self.assertEqual(self.summary(), (6, 2, Decimal("3.00")))
+        Review.objects.all().delete()
+        self.assertEqual(self.summary(), (0, 0, Decimal("0")))
+
+    def test_rebuild_reproduces_the_running_totals(self):
+        other = make_car(self.car.owner, name="Other")
+        make_car(self.car.owner, name="Unrated")
+        for i, rating in enumerate([5, 4, 4]):
+            self.review(rating, i)
+        self.review(3, 0, car=other)
+        expected = {car.pk: self.summary(car) for car in Car.objects.all()}
+        Car.objects.update(rating_sum=99, review_count=99, rating_avg=Decimal("1.00"))
+        out = StringIO()
+        call_command("rebuild_ratings", stdout=out)
+        self.assertIn("3 car(s)", out.getvalue())
+        self.assertEqual({car.pk: self.summary(car) for car in Car.objects.all()}, expected)
+
+
+def image_bytes(size=(800, 400), fmt="JPEG", exif=None):
+    out = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(out, fmt, **({"exif": exif} if exif else {}))
+    return out.getvalue()
+
+
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def store(self, data, name="cars/upload.jpg"):
+        return default_storage.save(name, ContentFile(data))
+
+    def open_rendition(self, image_hash, name, fmt):
+        return Image.open(default_storage.open(images.rendition_path(image_hash, name, fmt)))
+
+    def test_builds_every_width_and_format_under_the_content_hash(self):
+        data = image_bytes((1600, 1000))
+        image_hash = images.build_renditions(self.store(data))
+        self.assertEqual(image_hash, hashlib.sha256(data).hexdigest()[:images.HASH_LENGTH])
+        for name, width in images.RENDITIONS.items():
+            for fmt, (pil_format, _) in images.FORMATS.items():
+                with self.open_rendition(image_hash, name, fmt) as rendition:
+                    self.assertEqual((rendition.format, rendition.width), (pil_format, width))
+        # A second upload of the same bytes reuses the files.
+        with mock.patch.object(images, "_encode") as encode:
+            self.assertEqual(images.build_renditions(self.store(data, "cars/again.jpg")), image_hash)
+        encode.assert_not_called()
+
+    def test_small_originals_are_not_upscaled(self):
+        image_hash = images.build_renditions(self.store(image_bytes((300, 250))))
+        with self.open_rendition(image_hash, "detail", "jpeg") as rendition:
+            self.assertEqual(rendition.size, (300, 250))
+
+    def test_exif_is_applied_then_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees
+        exif[0x010F] = "PhoneMaker"
+        exif[0x8825] = {1: "N", 2: (52.0, 31.0, 12.0)}  # GPS
+        image_hash = images.build_renditions(self.store(image_bytes((800, 400), exif=exif)))
+        for fmt in images.FORMATS:
+            with self.open_rendition(image_hash, "card", fmt) as rendition:
+                self.assertEqual(rendition.size, (400, 800))
+                self.assertEqual(dict(rendition.getexif()), {})
+
+    def test_unusable_uploads_are_rejected(self):
+        with self.assertRaises(images.InvalidImage):
+            images.build_renditions(self.store(image_bytes((150, 600))))
+        with mock.patch.object(images, "MAX_PIXELS", 1000 * 1000):
+            with self.assertRaises(images.InvalidImage):
+                images.build_renditions(self.store(image_bytes((1200, 1000))))
+        with self.assertRaises(OSError):
+            images.build_renditions(self.store(b"%PDF-1.4 not an image", "cars/upload.pdf"))
+        self.assertFalse(default_storage.exists(images.RENDITION_DIR))
+
+    def test_urls_show_a_placeholder_until_ready(self):
+        car = make_car(image=ContentFile(image_bytes(), name="car.jpg"))
+        self.assertEqual(car.image_status, Car.IMAGE_PENDING)
+        self.assertEqual(images.rendition_url(car, "card"), static(images.PLACEHOLDER))
+        image_hash = images.build_renditions(car.image.name)
+        Car.objects.filter(pk=car.pk).update(image_hash=image_hash, image_status=Car.IMAGE_READY, image_source=car.image.name)
+        car.refresh_from_db()
+        url = images.rendition_url(car, "card", "webp")
+        self.assertTrue(url.endswith(f"{image_hash}-card.webp"))
+        self.assertIn(f"{url} 480w", images.srcset(car, "webp"))
+        response = self.client.get(reverse("car_rendition", args=[car.pk, "card", "webp"]))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+
+class ImageWorkerTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.executor = self.enterContext(ThreadPoolExecutor(max_workers=2))
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True)
+
+    def process(self, batch_size=20):
+        return images.process_pending(self.executor, batch_size)
+
+    def test_pending_uploads_become_ready_or_failed(self):
+        good = make_car(self.owner, name="Good", image=ContentFile(image_bytes(), name="good.jpg"))
+        bad = make_car(self.owner, name="Bad", image=ContentFile(b"not an image", name="bad.jpg"))
+        self.assertEqual({good.image_status, bad.image_status}, {Car.IMAGE_PENDING})
+        ready, failed = self.process()
+        self.assertEqual([car_id for car_id, _ in ready], [good.pk])
+        self.assertEqual([car_id for car_id, _ in failed], [bad.pk])
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((good.image_status, good.image_source), (Car.IMAGE_READY, good.image.name))
+        self.assertTrue(images.has_renditions(good))
+        self.assertEqual((bad.image_status, bad.image_hash), (Car.IMAGE_FAILED, ""))
+        self.assertEqual(self.process(), ([], []))
+
+    def test_new_upload_retries_a_failed_car(self):
+        car = make_car(self.owner, image=ContentFile(image_bytes((100, 100)), name="tiny.jpg"))
+        self.process()
+        car.refresh_from_db()
+        self.assertEqual(car.image_status, Car.IMAGE_FAILED)
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse("edit_car"), {
+            "car_id": car.pk, "name": car.name, "year": car.year, "transmission": car.transmission,
+            "mileage": car.mileage, "price": car.price, "description": "",
+            "image": SimpleUploadedFile("big.jpg", image_bytes(), content_type="image/jpeg"),
+        })
+        self.assertEqual(response.json()["image_status"], Car.IMAGE_PENDING)
+        ready, failed = self.process()
+        self.assertEqual((len(ready), failed), (1, []))
+        car.refresh_from_db()
+        self.assertEqual(car.image_status, Car.IMAGE_READY)
+
+    def test_result_for_a_replaced_image_is_dropped(self):
+        car = make_car(self.owner, image=ContentFile(image_bytes(), name="first.jpg"))
+        first = car.image.name
+        car.image = ContentFile(image_bytes((900, 500)), name="second.jpg")
+        car.save()
+        images._finish(car.pk, first, image_hash="stale", image_status=Car.IMAGE_READY)
+        car.refresh_from_db()
+        self.assertEqual((car.image_status, car.image_hash), (Car.IMAGE_PENDING, ""))
+
+    def test_batches_are_bounded(self):
+        for i in range(3):
+            make_car(self.owner, name=f"Car {i}", image=ContentFile(image_bytes(), name=f"car{i}.jpg"))
+        self.assertEqual(len(self.process(batch_size=2)[0]), 2)
+        self.assertEqual(len(self.process(batch_size=2)[0]), 1)
+        self.assertFalse(Car.objects.filter(image_status=Car.IMAGE_PENDING).exists())
+
+
+class ConcurrentBookingStressTests(TransactionTestCase):
+    """Fire identical booking requests in parallel; exactly one may win."""
+
+    workers = 8
+
+    def test_parallel_requests_cannot_double_book(self):
+        car = make_car()
+        renters = [User.objects.create_user(f"renter{i}") for i in range(self.workers)]
+        pickup = date.today() + timedelta(days=5)
+        form = booking_form(car, pickup, pickup + timedelta(days=4))
+
+        clients = []
+        for user in renters:
+            client = Client()
+            client.force_login(user)
+            clients.append((client, user))
+
+        barrier = threading.Barrier(self.workers)
+        statuses = []
+
+        def attempt(client, user):
+            barrier.wait(timeout=30)
+            try:
+                for retry in range(100):
+                    try:
+                        # SQLite refuses concurrent writers outright ("database
+                        # table is locked") instead of queueing them, possibly
+                        # after the booking itself committed. Retry like a
+                        # client would, but never book twice.
+                        if retry and Booking.objects.filter(user=user).exists():
+                            statuses.append(200)
+                        else:
+                            statuses.append(client.post(reverse("booking"), form).status_code)
+                        return
+                    except OperationalError:
+                        time.sleep(0.05)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=pair) for pair in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(statuses), self.workers)
+        self.assertEqual(statuses.count(200), 1)
+        self.assertEqual(Booking.objects.filter(car=car).count(), 1)
+        self.assertEqual(CarOccupancy.objects.filter(car=car).count(), 4)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class OutboxTests(TestCase):
+    def post_contact(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("contact"), {
+                "name": "Sam", "email": "sam@example.com", "subject": "Hi", "message": "Hello",
+            })
+
+    def test_request_only_queues_the_email(self):
+        self.post_contact()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_QUEUED)
+
+    def test_worker_sends_queued_emails(self):
+        self.post_contact()
+        self.post_contact()
+        call_command("send_queued_mail", stdout=mock.MagicMock())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+
+    def test_failed_send_is_retried_later(self):
+        self.post_contact()
+        with mock.patch("core.outbox.EmailMessage.send", side_effect=OSError("smtp down")):
+            self.assertEqual(outbox.send_batch(), (0, 1))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.STATUS_QUEUED)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(outbox.send_batch(), (0, 0))  # backing off
+
+    def test_smtp_runs_outside_the_claim_transaction(self):
+        self.post_contact()
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def send(message):
+            seen.append((len(connection.atomic_blocks), OutboundEmail.objects.get().status, outbox.claim(10)))
+            return 1
+
+        with mock.patch("core.outbox.EmailMessage.send", autospec=True, side_effect=send):
+            self.assertEqual(outbox.send_batch(), (1, 0))
+        self.assertEqual(seen, [(depth, OutboundEmail.STATUS_SENDING, [])])
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_SENT)
+
+    def test_expired_lease_is_claimed_again(self):
+        self.post_contact()
+        now = timezone.now()
+        stale = outbox.claim(10, now)
+        self.assertEqual(outbox.claim(10, now + timedelta(minutes=1)), [])
+        fresh = outbox.claim(10, now + outbox.SEND_LEASE + timedelta(seconds=1))
+        self.assertEqual([e.pk for e in fresh], [e.pk for e in stale])
+        # The worker that lost its lease can't record over the new holder.
+        outbox._record(stale, [], now)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_SENDING)
+        outbox._record(fresh, [], now)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_SENT)
+
+
+class ContractTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.renter = User.objects.create_user("renter", email="renter@example.com")
+        pickup = date.today() + timedelta(days=3)
+        self.booking = Booking.objects.create(
+            user=self.renter, car=make_car(), pickup_location="A", drop_location="B",
+            pickup_date=pickup, pickup_time="10:00", return_date=pickup + timedelta(days=2),
+            return_time="10:00", status=Booking.STATUS_PAID, days=2, total_price=Decimal("100.00"),
+        )
+        self.client.force_login(self.renter)
+
+    def approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("approve_contract"), {"booking_id": self.booking.pk})
+
+    def test_contract_is_stored_and_emailed_once(self):
+        self.assertTrue(self.approve().json()["success"])
+        self.approve()
+        self.booking.refresh_from_db()
+        self.assertTrue(self.booking.contract_file.startswith("contracts/"))
+        outbox.send_batch()
+        self.assertEqual(len(mail.outbox), 1)
+        filename, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual(mimetype, "text/html")
+        self.assertIn("$100.00", content)
+
+    def test_download_is_cached_by_etag(self):
+        self.approve()
+        url = reverse("booking_contract", args=[self.booking.pk])
+        response = self.client.get(url)
+        self.assertIn(b"ROYAL CARS RENTAL AGREEMENT", b"".join(response.streaming_content))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_other_users_cannot_download(self):
+        self.approve()
+        self.client.force_login(User.objects.create_user("other"))
+        self.assertEqual(self.client.get(reverse("booking_contract", args=[self.booking.pk])).status_code, 404)
+
+
+class OwnerApprovalTests(TestCase):
+    def setUp(self):
+        self.owners = [
+            User.objects.create_user(f"owner{i}", email=f"owner{i}@example.com", role="owner", is_active=False)
+            for i in range(5)
+        ]
+
+    def test_admin_action_approves_in_chunks(self):
+        self.client.force_login(User.objects.create_superuser("ops", "ops@example.com", "pw"))
+        with mock.patch.object(owners, "CHUNK_SIZE", 2), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:core_user_changelist"),
+                {"action": "approve_selected_owners", "_selected_action": [o.pk for o in self.owners]},
+                follow=True,
+            )
+        self.assertContains(response, "5 owner account(s) approved successfully in 3 batch(es)")
+        self.assertEqual(User.objects.filter(role="owner", is_approved=True, is_active=True).count(), 5)
+        self.assertEqual(OutboundEmail.objects.count(), 5)
+
+    def test_command_reports_progress_and_skips_approved(self):
+        User.objects.filter(pk=self.owners[0].pk).update(is_approved=True)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("approve_owners", "--chunk-size=2", stdout=out)
+        self.assertIn("Approved 4/4 owner(s)", out.getvalue())
+        self.assertEqual(OutboundEmail.objects.count(), 4)
+
+
+class OwnerDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True, company_name="Speedy")
+        self.renter = User.objects.create_user("renter")
+
+    def summary(self):
+        return OwnerSummary.objects.get(owner=self.owner)
+
+    def test_summary_follows_cars_reviews_and_bookings(self):
+        cheap = make_car(self.owner, price=40)
+        make_car(self.owner, price=90)
+        past = date.today() - timedelta(days=5)
+        booking = Booking.objects.create(
+            user=self.renter, car=cheap, pickup_location="A", drop_location="B", pickup_date=past,
+            pickup_time="10:00", return_date=past + timedelta(days=1), return_time="10:00",
+            status=Booking.STATUS_PAID,
+        )
+        Review.objects.create(booking=booking, car=cheap, user=self.renter, rating=4, comment="Good")
+        summary = self.summary()
+        self.assertEqual((summary.name, summary.listed, summary.car_count), ("Speedy", True, 2))
+        self.assertEqual((summary.min_price, summary.max_price), (Decimal("40"), Decimal("90")))
+        self.assertEqual((summary.rating_avg, summary.review_count, summary.booking_count), (Decimal("4"), 1, 1))
+
+        cheap.delete()
+        summary = self.summary()
+        self.assertEqual((summary.car_count, summary.min_price, summary.review_count, summary.booking_count), (1, Decimal("90"), 0, 0))
+
+        OwnerSummary.objects.update(car_count=0)
+        call_command("rebuild_owner_summaries", stdout=StringIO())
+        self.assertEqual(self.summary().car_count, 1)
+
+    def test_companies_page_is_one_read_at_any_size(self):
+        for i in range(3):
+            make_car(User.objects.create_user(f"fleet{i}", role="owner", is_approved=True))
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse("companies_list"))
+        cache.clear()
+        for i in range(20):
+            User.objects.create_user(f"extra{i}", role="owner", is_approved=True)
+        User.objects.create_user("unapproved", role="owner")
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse("companies_list"), {"sort": "fleet"})
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(response.context["owners"]), views.COMPANIES_PAGE_SIZE)
+        self.assertEqual(response.context["owners"].object_list[0].car_count, 1)
+
+        names = []
+        cursor = ""
+        while True:
+            page = self.client.get(reverse("companies_list"), {"sort": "name", "cursor": cursor}).context["page"]
+            names += [summary.name for summary in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(names, sorted(OwnerSummary.objects.filter(listed=True).values_list("name", flat=True)))
+        self.assertNotIn("unapproved", names)
+
+    def test_approving_lists_the_owner(self):
+        owner = User.objects.create_user("newcomer", role="owner", is_active=False)
+        self.assertFalse(OwnerSummary.objects.get(owner=owner).listed)
+        list(owners.approve(User.objects.filter(pk=owner.pk)))
+        self.assertTrue(OwnerSummary.objects.get(owner=owner).listed)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.car = make_car()
+
+    def test_repeat_requests_skip_the_database(self):
+        self.client.get(reverse("car"))
+        # Only the conditional GET validators (see core.conditional)
+        with self.assertNumQueries(2):
+            self.client.get(reverse("car"))
+        self.assertEqual(caching.stats(["car"])["car"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_saving_a_car_invalidates_listings(self):
+        self.client.get(reverse("car"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.name = "Corolla"
+            self.car.save()
+        self.assertContains(self.client.get(reverse("car")), "Corolla")
+
+    def test_owner_update_invalidates_detail(self):
+        self.client.get(reverse("detail", args=[self.car.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.owner.company_name = "Royal Rentals"
+            self.car.owner.save()
+        self.assertContains(self.client.get(reverse("detail", args=[self.car.pk])), "Royal Rentals")
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        self.car = make_car(self.owner)
+        self.other = make_car(self.owner, name="Civic")
+
+    def revalidate(self, url, **extra):
+        first = self.client.get(url, **extra)
+        self.assertEqual(first.status_code, 200, url)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"], **extra)
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        for url in [reverse("index"), reverse("car"), reverse("detail", args=[self.car.pk])]:
+            first, again = self.revalidate(url)
+            self.assertEqual(again.status_code, 304, url)
+            self.assertFalse(again.templates, url)
+            self.assertIn("private", first["Cache-Control"])
+        first, again = self.revalidate(reverse("search_cars") + "?q=camry")
+        self.assertEqual(again.status_code, 304)
+        self.assertIn("public", first["Cache-Control"])
+
+    def test_changes_invalidate_the_validators(self):
+        url = reverse("detail", args=[self.car.pk])
+        etag = self.client.get(url)["ETag"]
+        renter = User.objects.create_user("renter")
+        past = date.today() - timedelta(days=5)
+        booking = Booking.objects.create(
+            user=renter, car=self.car, pickup_location="A", drop_location="B", pickup_date=past,
+            pickup_time="10:00", return_date=past + timedelta(days=1), return_time="10:00",
+            status=Booking.STATUS_PAID,
+        )
+        Review.objects.create(booking=booking, car=self.car, user=renter, rating=5, comment="Great")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse("car"))["ETag"]
+        self.other.delete()
+        self.assertEqual(self.client.get(reverse("car"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pages_vary_per_user(self):
+        etag = self.client.get(reverse("car"))["ETag"]
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse("car"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class OwnerStorefrontTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True, company_name="Speedy")
+        self.cars = [make_car(self.owner, name=f"Car {i}") for i in range(3)]
+        self.url = reverse("owner_storefront", args=[self.owner.pk])
+
+    def test_unchanged_storefront_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Last-Modified", first)
+        with self.assertNumQueries(1):
+            again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_car_and_owner_changes_change_the_etag(self):
+        etags = [self.client.get(self.url)["ETag"]]
+        self.cars[0].price = 75
+        self.cars[0].save()
+        etags.append(self.client.get(self.url)["ETag"])
+        self.cars[1].delete()
+        etags.append(self.client.get(self.url)["ETag"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.company_name = "Speedier"
+            self.owner.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Speedier")
+        etags.append(response["ETag"])
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_owner_change_survives_a_cache_clear(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.owner.company_name = "Speedier"
+        self.owner.save()
+        cache.clear()  # a restart, or another worker's cache
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Speedier")
+
+    def test_fleet_is_stamped_once_per_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        stamps = [q for q in queries.captured_queries if 'MAX("core_car"."updated_at")' in q["sql"]]
+        self.assertEqual(len(stamps), 2)
+
+    def test_pages_through_the_fleet(self):
+        with mock.patch.object(views, "STOREFRONT_PAGE_SIZE", 2):
+            first = self.client.get(self.url).context["page"]
+            second = self.client.get(self.url, {"cursor": first.next_cursor}).context["page"]
+        self.assertEqual(len(first) + len(second), 3)
+        self.assertFalse(second.has_next)
+
+    def test_old_address_redirects(self):
+        response = self.client.get(reverse("owner_cars", args=[self.owner.pk]))
+        self.assertRedirects(response, self.url, status_code=301)
+
+
+class MetricsTests(TestCase):
+    def test_server_timing_header(self):
+        make_car()
+        header = self.client.get(reverse("car"))["Server-Timing"]
+        self.assertRegex(header, r'^sql;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_prometheus_endpoint_is_staff_only(self):
+        self.client.get(reverse("index"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 302)
+        self.client.force_login(User.objects.create_superuser("ops", "ops@example.com", "pw"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'royalcars_request_seconds_count{view="index",phase="total"}')
+
+    def test_histograms_are_cumulative(self):
+        def scrape():
+            text = metrics.render_prometheus()
+            return {
+                key: float(value)
+                for key, value in re.findall(r'^(royalcars_request_\w+\{view="index"[^}]*\}) (\S+)$', text, re.M)
+            }
+
+        self.client.get(reverse("index"))
+        before = scrape()
+        # Far past any window: nothing may drop out.
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 86400):
+            self.client.get(reverse("index"))
+            after = scrape()
+        self.assertEqual(set(after), set(before))
+        self.assertTrue(all(after[key] >= before[key] for key in before))
+        count = 'royalcars_request_seconds_count{view="index",phase="total"}'
+        self.assertEqual(after[count], before[count] + 1)
+        self.assertIn('royalcars_request_queries_bucket{view="index",le="+Inf"}', after)
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        self.renter = User.objects.create_user("renter", email="renter@example.com")
+        self.client.force_login(self.renter)
+        pickup = date.today() + timedelta(days=10)
+        for i in range(3):
+            self.client.post(reverse("booking"), booking_form(make_car(self.owner), pickup, pickup + timedelta(days=2)))
+        self.pending = list(Booking.objects.values_list("pk", flat=True))
+        self.paid = Booking.objects.create(
+            user=self.renter, car=make_car(self.owner), pickup_location="A", drop_location="B",
+            pickup_date=pickup, pickup_time="10:00", return_date=pickup + timedelta(days=1),
+            return_time="10:00", status=Booking.STATUS_PAID,
+        )
+        self.client.force_login(self.owner)
+
+    def bulk(self, action, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("bulk_booking_action"), {"action": action, "ids": ids})
+
+    def test_bulk_approve_skips_bookings_in_other_states(self):
+        other = make_car(User.objects.create_user("other", role="owner"))
+        response = self.bulk("approve", self.pending + [self.paid.pk, other.pk + 1000])
+        self.assertEqual(response.json()["changed"], sorted(self.pending))
+        self.assertEqual(response.json()["skipped"], sorted([self.paid.pk, other.pk + 1000]))
+        self.assertEqual(Booking.objects.filter(status=Booking.STATUS_APPROVED).count(), 3)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+    def test_bulk_reject_releases_days(self):
+        self.bulk("reject", self.pending)
+        self.assertFalse(CarOccupancy.objects.filter(booking_id__in=self.pending).exists())
+        self.assertTrue(CarOccupancy.objects.filter(booking=self.paid).exists())
+
+    def test_bulk_update_is_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk("reject", self.pending)
+        writes = [re.match(r'(\w+) (?:INTO |FROM )?"(\w+)"', q["sql"]).groups()
+                  for q in queries if q["sql"].startswith(("UPDATE", "INSERT", "DELETE"))]
+        self.assertEqual(writes, [
+            ("UPDATE", "core_booking"), ("DELETE", "core_caroccupancy"), ("INSERT", "core_outboundemail"),
+        ])
+
+    def test_admin_save_detects_status_change_without_refetch(self):
+        booking = Booking.objects.get(pk=self.pending[0])
+        self.assertEqual(booking.original_status, Booking.STATUS_PENDING)
+        admin = User.objects.create_superuser("ops", "ops@example.com", "pw")
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:core_booking_changelist"),
+                {"action": "approve_selected", "_selected_action": self.pending},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Booking.objects.filter(status=Booking.STATUS_APPROVED).count(), 3)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+
+
+class BookingLifecycleTests(TestCase):
+    def setUp(self):
+        self.renter = User.objects.create_user("renter", email="renter@example.com")
+        self.pickup = date.today() + timedelta(days=10)
+        self.client.force_login(self.renter)
+
+    def book(self, car=None):
+        car = car or make_car(User.objects.create_user(f"owner{Car.objects.count()}", role="owner"))
+        self.client.post(reverse("booking"), booking_form(car, self.pickup, self.pickup + timedelta(days=2)))
+        return Booking.objects.get(car=car)
+
+    def test_new_booking_is_held_until_its_deadline(self):
+        booking = self.book()
+        self.assertEqual(booking.expires_at, booking.created_at + Booking.HOLD_DURATIONS[Booking.STATUS_PENDING])
+
+    def test_final_status_cannot_be_left(self):
+        booking = self.book()
+        booking.status = Booking.STATUS_REJECTED
+        booking.save()
+        self.assertIsNone(booking.expires_at)
+        booking.status = Booking.STATUS_APPROVED
+        with self.assertRaises(ValidationError):
+            booking.save()
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, Booking.STATUS_REJECTED)
+
+    def test_sweeper_expires_stale_holds_in_batches(self):
+        stale = [self.book() for _ in range(3)]
+        fresh = self.book()
+        Booking.objects.filter(pk__in=[b.pk for b in stale]).update(expires_at=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            batches = list(transitions.expire_stale(batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(
+            set(Booking.objects.filter(status=Booking.STATUS_EXPIRED).values_list("pk", flat=True)),
+            {b.pk for b in stale},
+        )
+        self.assertEqual(set(CarOccupancy.objects.values_list("booking_id", flat=True)), {fresh.pk})
+        self.assertEqual(OutboundEmail.objects.filter(subject="⌛ Booking Expired").count(), 3)
+
+    def test_checkout_extends_the_hold_past_the_session(self):
+        booking = self.book()
+        Booking.objects.filter(pk=booking.pk).update(
+            status=Booking.STATUS_APPROVED, expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        booking.refresh_from_db()
+        with override_settings(PAYMENT_GATEWAY="core.payments.FakeGateway"):
+            cache.clear()
+            payments.checkout(booking)
+        booking.refresh_from_db()
+        self.assertGreater(booking.expires_at, timezone.now() + timedelta(seconds=payments.SESSION_LIFETIME))
+
+    def test_expire_bookings_command(self):
+        booking = self.book()
+        Booking.objects.filter(pk=booking.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command("expire_bookings", stdout=out)
+        self.assertIn("Expired 1 booking(s).", out.getvalue())
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, Booking.STATUS_EXPIRED)
+
+
+
+class MyBookingsTests(TestCase):
+    def setUp(self):
+        self.renter = User.objects.create_user("renter")
+        self.client.force_login(self.renter)
+        self.car = make_car()
+
+    def add_bookings(self, count):
+        past = date.today() - timedelta(days=60)
+        start = Booking.objects.count()
+        for i in range(start, start + count):
+            booking = Booking.objects.create(
+                user=self.renter, car=self.car, pickup_location="A", drop_location="B",
+                pickup_date=past + timedelta(days=2 * i), pickup_time="10:00",
+                return_date=past + timedelta(days=2 * i + 1), return_time="10:00", status=Booking.STATUS_PAID,
+            )
+            if i % 2:
+                Review.objects.create(booking=booking, car=self.car, user=self.renter, comment="Good")
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        self.add_bookings(2)
+        few = self.queries_for(reverse("my_bookings"))
+        self.add_bookings(10)
+        self.assertEqual(self.queries_for(reverse("my_bookings")), few)
+
+    def test_feed_pages_through_every_booking_once(self):
+        self.add_bookings(5)
+        seen, cursor = [], ""
+        while True:
+            data = self.client.get(reverse("my_bookings_api"), {"limit": 2, "cursor": cursor}).json()
+            seen += data["results"]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual([b["id"] for b in seen], list(
+            Booking.objects.order_by("-created_at", "-id").values_list("pk", flat=True)
+        ))
+        self.assertEqual(sum(b["has_comment"] for b in seen), 2)
+        self.assertEqual(sum(b["can_comment"] for b in seen), 3)
+
+    def test_cursor_keeps_microseconds(self):
+        self.add_bookings(4)
+        moment = timezone.now().replace(microsecond=500000)
+        for i, pk in enumerate(Booking.objects.order_by("pk").values_list("pk", flat=True)):
+            Booking.objects.filter(pk=pk).update(created_at=moment + timedelta(microseconds=100 * i))
+        seen, cursor = [], ""
+        while True:
+            data = self.client.get(reverse("my_bookings_api"), {"limit": 1, "cursor": cursor}).json()
+            seen += [b["id"] for b in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, list(Booking.objects.order_by("-created_at", "-id").values_list("pk", flat=True)))
+        self.assertEqual(len(seen), 4)
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get(reverse("my_bookings"), {"cursor": "nope"}).status_code, 404)
+        self.assertEqual(self.client.get(reverse("my_bookings_api"), {"cursor": "nope"}).status_code, 400)
+
+
+@override_settings(PAYMENT_GATEWAY="core.payments.FakeGateway")
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.renter = User.objects.create_user("renter")
+        pickup = date.today() + timedelta(days=3)
+        self.booking = Booking.objects.create(
+            user=self.renter, car=make_car(), pickup_location="A", drop_location="B",
+            pickup_date=pickup, pickup_time="10:00", return_date=pickup + timedelta(days=2),
+            return_time="10:00", status=Booking.STATUS_APPROVED, days=2, total_price=Decimal("100.00"),
+        )
+        self.client.force_login(self.renter)
+        self.gateway = payments.gateway()
+        self.gateway.sessions.clear()
+        self.gateway.requests.clear()
+
+    def test_repeat_pay_reuses_the_open_session(self):
+        url = reverse("pay_booking", args=[self.booking.pk])
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first["Location"], second["Location"])
+        self.assertEqual(len(self.gateway.requests), 1)
+        self.booking.refresh_from_db()
+        self.assertTrue(first["Location"].endswith(self.booking.stripe_session_id))
+        params = self.gateway.requests[0][0]
+        self.assertEqual(params["line_items"][0]["price_data"]["unit_amount"], 10000)
+
+    def test_cache_miss_reuses_session_through_idempotency_key(self):
+        window_start = (time.time() // payments.REUSE_WINDOW) * payments.REUSE_WINDOW
+        with mock.patch("core.payments.time.time", return_value=window_start + 5):
+            first = payments.checkout(self.booking)
+        cache.clear()
+        # Later in the same window: same key, so the parameters must match too.
+        with mock.patch("core.payments.time.time", return_value=window_start + payments.REUSE_WINDOW - 5):
+            self.assertEqual(payments.checkout(self.booking), first)
+        self.assertEqual(len(self.gateway.sessions), 1)
+        self.assertEqual(self.gateway.requests[0], self.gateway.requests[1])
+
+    def test_session_expiry_stays_within_stripe_limits(self):
+        window = int(time.time() // payments.REUSE_WINDOW)
+        for created in (window * payments.REUSE_WINDOW, (window + 1) * payments.REUSE_WINDOW - 1):
+            lifetime = payments.session_expiry(window) - created
+            self.assertGreaterEqual(lifetime, 30 * 60)
+            self.assertLessEqual(lifetime, 24 * 60 * 60)
+
+    def test_fake_gateway_rejects_a_reused_key_with_other_params(self):
+        self.gateway.create_checkout_session({"amount": 1}, "key")
+        with self.assertRaises(stripe.IdempotencyError):
+            self.gateway.create_checkout_session({"amount": 2}, "key")
+
+    def test_gateway_error_is_reported(self):
+        with mock.patch.object(payments.FakeGateway, "create_checkout_session",
+                               side_effect=stripe.APIConnectionError("timed out")):
+            response = self.client.get(reverse("pay_booking", args=[self.booking.pk]))
+        self.assertRedirects(response, reverse("my_bookings"), fetch_redirect_response=False)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.renter = User.objects.create_user("renter", email="renter@example.com")
+        pickup = date.today() + timedelta(days=3)
+        self.booking = Booking.objects.create(
+            user=self.renter, car=make_car(), pickup_location="A", drop_location="B",
+            pickup_date=pickup, pickup_time="10:00", return_date=pickup + timedelta(days=2),
+            return_time="10:00", status=Booking.STATUS_APPROVED, stripe_session_id="cs_test_1",
+        )
+
+    def deliver(self, event, secret=None):
+        payload, signature = payments.sign(event, secret)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("stripe_webhook"), payload, content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=signature,
+            )
+
+    def test_completed_session_marks_booking_paid(self):
+        response = self.deliver(payments.fake_event(self.booking))
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, Booking.STATUS_PAID)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_redelivered_event_is_applied_once(self):
+        event = payments.fake_event(self.booking)
+        self.deliver(event)
+        Booking.objects.filter(pk=self.booking.pk).update(status=Booking.STATUS_APPROVED)
+        self.assertEqual(self.deliver(event).status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, Booking.STATUS_APPROVED)
+        self.assertEqual(ProcessedStripeEvent.objects.count(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_unpaid_session_is_left_alone(self):
+        self.deliver(payments.fake_event(self.booking, payment_status="unpaid"))
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, Booking.STATUS_APPROVED)
+
+    def test_bad_signature_is_rejected(self):
+        response = self.deliver(payments.fake_event(self.booking), secret="whsec_other")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProcessedStripeEvent.objects.exists())
+
+    def test_success_page_reads_local_state(self):
+        self.client.force_login(self.renter)
+        url = reverse("payment_success") + "?session_id=cs_test_1"
+        with mock.patch("stripe.checkout.Session.retrieve") as retrieve:
+            self.client.get(url)
+            self.deliver(payments.fake_event(self.booking))
+            response = self.client.get(url, follow=True)
+        retrieve.assert_not_called()
+        self.assertContains(response, "Payment successful")
+
+
+class MileageTests(TestCase):
+    def test_parse(self):
+        for text, km in [
+            ("10k", 10000), ("45,000 km", 45000), ("1 500 km", 1500), ("30k miles", 48280),
+            ("12.5k", 12500), ("80000", 80000), ("", None), ("low", None), (None, None),
+        ]:
+            self.assertEqual(mileage.parse(text), km, text)
+
+    def test_save_keeps_number_in_step(self):
+        car = make_car(mileage="45,000 km")
+        self.assertEqual(car.mileage_km, 45000)
+        car.mileage = "60k"
+        car.save(update_fields=["mileage"])
+        car.refresh_from_db()
+        self.assertEqual(car.mileage_km, 60000)
+        car.mileage = "unknown"
+        car.save()
+        self.assertIsNone(Car.objects.get(pk=car.pk).mileage_km)
+
+    def test_catalog_filters_by_range(self):
+        cache.clear()
+        owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        for name, text in [("Low", "5k"), ("Mid", "40,000 km"), ("High", "90k miles"), ("Odd", "n/a")]:
+            make_car(owner, name=name, mileage=text)
+        response = self.client.get(reverse("cars_api"), {"min_mileage": 1000, "max_mileage": 50000})
+        self.assertEqual(sorted(c["name"] for c in response.json()["results"]), ["Low", "Mid"])
+        self.assertEqual(self.client.get(reverse("cars_api"), {"max_mileage": "10k"}).status_code, 400)
+        # Unknown mileage can't be placed in a mileage order
+        names, cursor = [], ""
+        while True:
+            data = self.client.get(reverse("cars_api"), {"sort": "mileage", "limit": 1, "cursor": cursor}).json()
+            names += [c["name"] for c in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(names, ["Low", "Mid", "High"])
+
+
+class QueryPlanTests(TestCase):
+    """Hot pages must reach every table through an index."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", role="owner", is_approved=True)
+        self.renter = User.objects.create_user("renter")
+        self.cars = [make_car(self.owner, name=f"Car {i}", year=2020 + i) for i in range(3)]
+        pickup = date.today() + timedelta(days=3)
+        for i, car in enumerate(self.cars):
+            booking = Booking.objects.create(
+                user=self.renter, car=car, pickup_location="A", drop_location="B",
+                pickup_date=pickup, pickup_time="10:00",
+                return_date=pickup + timedelta(days=i + 1), return_time="10:00",
+            )
+            Review.objects.create(booking=booking, car=car, user=self.renter, rating=4, comment="Good")
+
+    def assertNoFullScans(self, path, user=None):
+        if user:
+            self.client.force_login(user)
+        with FullScanCheck() as check:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        self.assertFalse(check.offenders, f"{path}\n{check.report()}")
+
+    def test_public_pages(self):
+        car = self.cars[0]
+        pickup = date.today() + timedelta(days=30)
+        for path in [
+            reverse("index"),
+            reverse("car"),
+            reverse("car") + "?sort=rating&min_price=10",
+            reverse("cars_api") + "?min_price=10&max_price=100",
+            reverse("cars_api") + "?min_mileage=1000&max_mileage=50000",
+            reverse("cars_api") + "?sort=rating&max_mileage=50000",
+            reverse("cars_api") + "?sort=price",
+            reverse("cars_api") + "?sort=mileage",
+            reverse("cars_api") + "?transmission=AUTO&min_year=2020",
+            reverse("cars_api"),
+            reverse("available_cars_api") + f"?pickup_date={pickup}&return_date={pickup + timedelta(days=2)}",
+            reverse("detail", args=[car.pk]),
+            reverse("search_cars") + "?q=car",
+            reverse("owner_storefront", args=[self.owner.pk]),
+            *(reverse("companies_list") + f"?sort={sort}" for sort in views.COMPANIES_SORTS),
+        ]:
+            with self.subTest(path=path):
+                self.assertNoFullScans(path)
+
+    def test_limit_only_excuses_unfiltered_index_walks(self):
+        with FullScanCheck() as walk:
+            list(Car.objects.order_by(*views.CATALOG_ORDERING)[:2])
+        with FullScanCheck() as filtered_walk:
+            list(Car.objects.filter(description__icontains="x").order_by(*views.CATALOG_ORDERING)[:2])
+        self.assertFalse(walk.offenders, walk.report())
+        self.assertTrue(filtered_walk.offenders)
+
+    @skipUnless(connection.vendor == "sqlite", "reads SQLite plan details")
+    def test_range_filters_seek_their_indexes(self):
+        pickup = date.today() + timedelta(days=30)
+        window = f"pickup_date={pickup}&return_date={pickup + timedelta(days=2)}"
+        for path, index in [
+            (reverse("cars_api") + "?sort=price&min_price=10&max_price=100", "car_price_idx"),
+            (reverse("cars_api") + "?sort=mileage&min_mileage=1000&max_mileage=50000", "car_mileage_idx"),
+            (reverse("available_cars_api") + f"?{window}&sort=price&max_price=100", "car_price_idx"),
+            (reverse("cars_api") + "?transmission=AUTO&min_year=2020", "car_transmission_catalog_idx"),
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(path)
+            plans = [
+                row["detail"] for query in queries.captured_queries
+                if query["sql"].startswith('SELECT "core_car"') for row in queryplan.explain(query["sql"])
+            ]
+            self.assertIn(f"SEARCH core_car USING INDEX {index} (", "\n".join(plans), path)
+
+    def test_owner_dashboard(self):
+        self.assertNoFullScans(reverse("owner_dashboard"), self.owner)
+
+    def test_my_bookings(self):
+        self.assertNoFullScans(reverse("my_bookings"), self.renter)
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_and_measure(self):
+        benchmark.seed(50)
+        self.assertEqual(Car.objects.count(), 50)
+        bench = OwnerSummary.objects.get(owner__username=benchmark.BENCH_OWNER)
+        self.assertEqual(bench.car_count, Car.objects.filter(owner=bench.owner).count())
+        self.assertEqual(OwnerSummary.objects.filter(listed=True).count(), User.objects.filter(role="owner").count())
+        results = benchmark.run(repeat=1, only=["index", "owner_dashboard", "my_bookings"])
+        self.assertEqual({r["status"] for r in results.values()}, {200})
+        self.assertTrue(all(r["queries"] > 0 for r in results.values()))
+
+    def test_deferred_work_is_counted_and_files_are_discarded(self):
+        benchmark.seed(20)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        with CaptureQueriesContext(connection) as queries:
+            results = benchmark.run(repeat=1, only=["contact", "approve_contract"])
+        self.assertTrue(any("INSERT INTO \"core_outboundemail\"" in q["sql"] for q in queries.captured_queries))
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertLess(results["contact"]["status"], 400)
+        self.assertLess(results["approve_contract"]["status"], 400)
+        self.assertEqual(os.listdir(media), [])
+
+    def test_flag_scaling(self):
+        results = {
+            "flat": {"100": {"queries": 3}, "1000": {"queries": 3}},
+            "n_plus_one": {"100": {"queries": 5}, "1000": {"queries": 50}},
+            "skipped": {"100": {"skipped": "external"}, "1000": {"skipped": "external"}},
+        }
+        self.assertEqual(benchmark.flag_scaling(results), {"n_plus_one": {"100": 5, "1000": 50}})
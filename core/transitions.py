@@ -0,0 +1,116 @@
+"""
+Booking status changes, one booking or many at a time.
+
+transition() moves a set of bookings to a new status with a single
+UPDATE ... WHERE id IN (...). The legal source statuses come from
+Booking.TRANSITIONS and are repeated in the WHERE clause. A booking that
+changed since it was selected (paid in the meantime, rejected by another
+tab) is skipped, not overwritten. Bookings leaving the active statuses
+give their days back to the calendar in one DELETE. The renters'
+notifications are queued with one INSERT through the outbox.
+
+expire_stale() is the sweeper behind `manage.py expire_bookings`. Pending
+and approved bookings hold the car's dates until Booking.expires_at; past
+that they are expired in batches, through transition(), using the
+(status, expires_at) index.
+
+queryset.update() skips post_save, so this module does what the
+signals would have done for a status change.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability, outbox
+from .models import Booking, CarOccupancy
+
+FROM_EMAIL = "noreply@royalcars.com"
+EXPIRE_BATCH_SIZE = 500
+
+
+def notification(booking, status):
+    """(subject, body) of the email telling the renter about `status`, or None."""
+    if status == Booking.STATUS_APPROVED:
+        return "✅ Booking Approved", (
+            f"Hello {booking.user.username},\n\n"
+            f"Your booking has been approved!\n\n"
+            f"Car: {booking.car.name}\n"
+            f"Pickup: {booking.pickup_location}\n"
+            f"Drop: {booking.drop_location}\n"
+            f"Date: {booking.pickup_date}\n"
+            f"Time: {booking.pickup_time}\n\n"
+            "Thank you for choosing Royal Cars!"
+        )
+    if status == Booking.STATUS_REJECTED:
+        return "❌ Booking Rejected", (
+            f"Hello {booking.user.username},\n\n"
+            f"Unfortunately, your booking has been rejected.\n\n"
+            f"Car: {booking.car.name}\n"
+            f"Pickup: {booking.pickup_location}\n"
+            f"Date: {booking.pickup_date} {booking.pickup_time}\n\n"
+            "You may contact us for further details."
+        )
+    if status == Booking.STATUS_EXPIRED:
+        return "⌛ Booking Expired", (
+            f"Hello {booking.user.username},\n\n"
+            f"Your booking was not completed in time and has expired. The dates are free again.\n\n"
+            f"Car: {booking.car.name}\n"
+            f"Date: {booking.pickup_date} → {booking.return_date}\n\n"
+            "You are welcome to book again on Royal Cars."
+        )
+    return None
+
+
+def notify(bookings, status):
+    """Queue the renters' emails for `bookings`, now in `status`, in one INSERT."""
+    emails = []
+    for booking in bookings:
+        content = notification(booking, status)
+        if content and booking.user and booking.user.email:
+            emails.append((*content, FROM_EMAIL, [booking.user.email]))
+    outbox.enqueue_many(emails)
+
+
+def transition(queryset, status, now=None):
+    """
+    Move every booking in `queryset` that is allowed to reach `status`.
+    Returns (changed, skipped), both lists of booking ids.
+    """
+    allowed = Booking.sources(status)
+    with transaction.atomic():
+        requested = set(queryset.order_by().values_list("pk", flat=True))
+        # Lock the candidates so the status we checked is the one we update.
+        candidates = list(
+            Booking.objects.select_for_update()
+            .filter(pk__in=requested, status__in=allowed)
+            .order_by()
+            .values_list("pk", flat=True)
+        )
+        changed = []
+        if candidates:
+            Booking.objects.filter(pk__in=candidates, status__in=allowed).update(
+                **Booking.status_fields(status, now)
+            )
+            changed = candidates
+            if status not in availability.ACTIVE_STATUSES:
+                CarOccupancy.objects.filter(booking_id__in=changed).delete()
+            notify(Booking.objects.filter(pk__in=changed).select_related("user", "car"), status)
+    return sorted(changed), sorted(requested - set(changed))
+
+
+def expire_stale(batch_size=None, now=None):
+    """
+    Expire the pending and approved bookings whose hold ended before `now`,
+    `batch_size` (default EXPIRE_BATCH_SIZE) at a time. Yields the ids
+    expired by each batch.
+    """
+    batch_size = batch_size or EXPIRE_BATCH_SIZE
+    now = now or timezone.now()
+    stale = Booking.objects.filter(status__in=list(Booking.HOLD_DURATIONS), expires_at__lt=now)
+    while True:
+        batch = list(stale.order_by("expires_at").values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return
+        changed, _ = transition(Booking.objects.filter(pk__in=batch), Booking.STATUS_EXPIRED, now)
+        yield changed
+        if len(batch) < batch_size:
+            return
@@ -1,4 +1,5 @@
 from django.urls import path
+from django.views.generic import RedirectView
 from . import views
 
 urlpatterns = [
@@ -14,22 +15,32 @@ urlpatterns = [
     path('register/owner/', views.register_owner_view, name="register_owner"),
     path('profile/', views.profile_view, name="profile"),
     path('car/', views.car, name="car"),
+    path('api/cars/', views.cars_api, name="cars_api"),
+    path('api/cars/available/', views.available_cars_api, name="available_cars_api"),
     path('detail/<int:pk>/', views.detail, name="detail"),
+    path('cars/<int:car_id>/image/<str:rendition>.<str:fmt>', views.car_rendition, name="car_rendition"),
     path('search/', views.search_cars, name="search_cars"),
     path('booking/', views.booking_view, name="booking"),
     path('booking/<int:booking_id>/approve/', views.approve_booking, name="approve_booking"),
     path('booking/<int:booking_id>/reject/', views.reject_booking, name="reject_booking"),
+    path('owner/bookings/bulk/', views.bulk_booking_action, name="bulk_booking_action"),
     path('owner/dashboard/', views.owner_dashboard, name="owner_dashboard"),
     path('owner/add-car/', views.add_car, name="add_car"),
     path('edit_car/', views.edit_car, name='edit_car'),
 path('delete_car/<int:car_id>/', views.delete_car, name='delete_car'),
-    path('owner/<int:owner_id>/cars/', views.owner_cars, name="owner_cars"),
-    path('owner/<int:owner_id>/', views.owner_profile, name="owner_profile"),
+    path('owner/<int:owner_id>/', views.owner_storefront, name="owner_storefront"),
+    # Old storefront address
+    path('owner/<int:owner_id>/cars/', RedirectView.as_view(pattern_name="owner_storefront", permanent=True, query_string=True), name="owner_cars"),
     path('companies/', views.companies_list, name="companies_list"),
     path("my-bookings/", views.my_bookings, name="my_bookings"),
+    path("api/my-bookings/", views.my_bookings_api, name="my_bookings_api"),
     path("booking/<int:booking_id>/pay/", views.pay_booking, name="pay_booking"),
     path("payment/success/", views.payment_success, name="payment_success"),
     path("payment/cancel/", views.payment_cancel, name="payment_cancel"),
+    path("payment/webhook/", views.stripe_webhook, name="stripe_webhook"),
     path("bookings/<int:booking_id>/comment/", views.add_comment, name="add_comment"),
     path('approve_contract/', views.approve_contract, name='approve_contract'),
+    path("bookings/<int:booking_id>/contract/", views.booking_contract, name="booking_contract"),
+    path('monitoring/cache/', views.cache_stats, name='cache_stats'),
+    path('monitoring/metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -2,28 +2,161 @@ from django.shortcuts import render, redirect, get_object_or_404 , HttpResponseR
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
-from django.core.mail import send_mail
+from django.db.models import Count, Exists, Max, OuterRef, Q
 from django.conf import settings
+from django.core.paginator import Paginator
 from datetime import datetime, date 
 from django.utils import timezone
 import stripe
-from .models import Booking, Car , Review, User
+from .models import Booking, Car , OwnerSummary, Review, User
+from .pagination import KeysetPaginator, InvalidCursor
+from . import availability, caching, conditional, contracts, dashboard, images, metrics, outbox, payments, search, transitions
+from .filters import InvalidFilter, parse_car_filters
 from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import reverse
+from django.core.files.storage import default_storage
 
 User = get_user_model()
 
+# Car.Meta.ordering plus the primary key as a unique tie-breaker
+CATALOG_ORDERING = ["-year", "name", "id"]
+RATING_ORDERING = ["-rating_avg", "id"]
+# Cheapest / lowest mileage first; a price or mileage range given with its
+# own sort is one range scan of its index cut short by LIMIT.
+PRICE_ORDERING = ["price", "id"]
+MILEAGE_ORDERING = ["mileage_km", "id"]
+CATALOG_SORTS = {
+    "newest": CATALOG_ORDERING,
+    "rating": RATING_ORDERING,
+    "price": PRICE_ORDERING,
+    "mileage": MILEAGE_ORDERING,
+}
+CATALOG_PAGE_SIZE = 12
+INDEX_PAGE_SIZE = 6
+API_MAX_PAGE_SIZE = 50
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_OFFSET = 1000
+AVAILABILITY_CACHE_TTL = 60  # seconds
+DASHBOARD_PAGE_SIZE = 20
+# Newest first, with the primary key as a unique tie-breaker
+MY_BOOKINGS_ORDERING = ["-created_at", "-id"]
+MY_BOOKINGS_PAGE_SIZE = 20
+REVIEWS_PAGE_SIZE = 10
+# Company directory over OwnerSummary, each sort backed by its own index
+COMPANIES_SORTS = {
+    "name": ["name", "owner_id"],
+    "fleet": ["-car_count", "owner_id"],
+    "rating": ["-rating_avg", "owner_id"],
+    "bookings": ["-booking_count", "owner_id"],
+}
+COMPANIES_PAGE_SIZE = 12
+INDEX_OWNERS = 6
+STOREFRONT_PAGE_SIZE = 12
+# Booking volume changes without a cache invalidation; let it lag this long.
+COMPANIES_CACHE_TTL = 300  # seconds
+# Views reading through core.caching, as reported by cache_stats
+CACHED_VIEWS = (
+    "index", "car", "cars_api", "available_cars", "detail", "detail_reviews",
+    "companies", "owner_storefront",
+)
+
+
+def _car_to_dict(car):
+    return {
+        "id": car.id,
+        "name": car.name,
+        "year": car.year,
+        "transmission": car.transmission,
+        "mileage": car.mileage,
+        "mileage_km": car.mileage_km,
+        "price": str(car.price),
+        "image": images.rendition_url(car, "card"),
+        "rating_avg": str(car.rating_avg),
+        "review_count": car.review_count,
+    }
+
+
+def _catalog_page(cursor=None, per_page=None, queryset=None, ordering=CATALOG_ORDERING):
+    queryset = Car.objects.all() if queryset is None else queryset
+    paginator = KeysetPaginator(queryset, ordering, per_page or CATALOG_PAGE_SIZE)
+    return paginator.page(cursor)
+
+
+def _catalog_sort(request):
+    """The ?sort= of a catalog listing, newest first when missing or unknown."""
+    sort = request.GET.get("sort")
+    return sort if sort in CATALOG_SORTS else "newest"
+
+
+def _sorted_catalog_page(sort, cursor, per_page, queryset):
+    if sort == "mileage":
+        # A cursor can't hold NULL, so cars of unknown mileage have no place here
+        queryset = queryset.filter(mileage_km__isnull=False)
+    return _catalog_page(cursor, per_page, queryset, CATALOG_SORTS[sort])
+
+
+def _filtered_catalog_page(request, per_page=None):
+    """Catalog page honouring ?sort= and the core.filters query params."""
+    lookups = parse_car_filters(request.GET)
+    return _sorted_catalog_page(
+        _catalog_sort(request), request.GET.get("cursor"), per_page, Car.objects.filter(**lookups)
+    )
+
+
+def _companies_page(sort="name", cursor=None, per_page=COMPANIES_PAGE_SIZE):
+    # `listed IN (true)` rather than a bare `WHERE listed`, which SQLite
+    # doesn't treat as an equality and so can't seek the (listed, ...) indexes
+    queryset = OwnerSummary.objects.filter(listed__in=[True]).select_related("owner")
+    return KeysetPaginator(queryset, COMPANIES_SORTS.get(sort, COMPANIES_SORTS["name"]), per_page).page(cursor)
+
+
+def _params(request):
+    """Hashable form of the query string, for cache keys."""
+    return sorted(request.GET.lists())
+
+
+def _query_without_cursor(request):
+    query = request.GET.copy()
+    query.pop("cursor", None)
+    return query.urlencode()
+
+
+def _page_size(request, default=CATALOG_PAGE_SIZE):
+    try:
+        return min(max(int(request.GET.get("limit", default)), 1), API_MAX_PAGE_SIZE)
+    except ValueError:
+        return default
+
 
 # ===========================
 # PUBLIC PAGES
 # ===========================
+def _catalog_stamps(request, *args, **kwargs):
+    """Any car edit moves the first; a deleted car moves its owner's summary."""
+    return conditional.newest(Car.objects.all()), conditional.newest(OwnerSummary.objects.all())
+
+
+def _detail_stamps(request, pk):
+    """The car (its rating included), its reviews and its owner's details, in one query."""
+    return (
+        Car.objects.filter(pk=pk)
+        .annotate(reviews_updated=Max("reviews__updated_at"), review_total=Count("reviews"))
+        .values_list("updated_at", "owner__summary__updated_at", "reviews_updated", "review_total")
+        .first()
+    )
+
+
+@conditional.conditional(_catalog_stamps)
 def index(request):
-    owners = User.objects.filter(role="owner", is_approved=True)
-    cars = Car.objects.all()
-    return render(request, "index.html", {"owners": owners, "cars": cars})
+    def build():
+        owners = list(_companies_page("fleet", per_page=INDEX_OWNERS))
+        return owners, _catalog_page(per_page=INDEX_PAGE_SIZE)
+
+    owners, page = caching.get_or_set("index", ["catalog", "owners"], (), build)
+    return render(request, "index.html", {"owners": owners, "cars": page, "page": page})
 
 
 def about(request):
@@ -42,16 +175,119 @@ def testimonial(request):
     return render(request, "testimonial.html")
 
 
+@conditional.conditional(_catalog_stamps)
 def car(request):
-    cars = Car.objects.all()
-    return render(request, "car.html", {"cars": cars})
+    try:
+        page = caching.get_or_set(
+            "car", ["catalog"], _params(request), lambda: _filtered_catalog_page(request)
+        )
+    except (InvalidCursor, InvalidFilter):
+        raise Http404("Invalid catalog page.")
+    return render(request, "car.html", {
+        "cars": page,
+        "page": page,
+        "query": _query_without_cursor(request),
+        "sort": _catalog_sort(request),
+    })
 
 
+def cars_api(request):
+    """
+    JSON view of the catalog; pass `next_cursor` back as `cursor` to get the
+    next page. Accepts sort=newest|rating|price|mileage and the core.filters
+    params.
+    """
+    def build():
+        page = _filtered_catalog_page(request, _page_size(request))
+        return {
+            "results": [_car_to_dict(c) for c in page],
+            "next_cursor": page.next_cursor,
+        }
+
+    try:
+        data = caching.get_or_set("cars_api", ["catalog"], _params(request), build)
+    except (InvalidCursor, InvalidFilter) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(data)
+
+
+def available_cars_api(request):
+    """
+    Cars free for the whole [pickup_date, return_date) window, with the same
+    overlap rules booking_view applies. Optional filters: transmission,
+    min_year/max_year, min_price/max_price, min_mileage/max_mileage (km),
+    and sort as in cars_api. Results are cached briefly per window +
+    filters + sort + page.
+    """
+    try:
+        pickup_date = datetime.strptime(request.GET.get("pickup_date", ""), "%Y-%m-%d").date()
+        return_date = datetime.strptime(request.GET.get("return_date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"error": "pickup_date and return_date must be YYYY-MM-DD."}, status=400)
+    if return_date < pickup_date:
+        return JsonResponse({"error": "Return date must be after pickup date."}, status=400)
+    if pickup_date > availability.LAST_PICKUP_DATE:
+        return JsonResponse({"error": "Pickup date is out of range."}, status=400)
+
+    try:
+        lookups = parse_car_filters(request.GET)
+    except InvalidFilter as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    per_page = _page_size(request)
+    cursor = request.GET.get("cursor")
+    sort = _catalog_sort(request)
+
+    def build():
+        queryset = availability.available_cars(
+            pickup_date, return_date, Car.objects.filter(**lookups)
+        )
+        page = _sorted_catalog_page(sort, cursor, per_page, queryset)
+        return {
+            "results": [_car_to_dict(c) for c in page],
+            "next_cursor": page.next_cursor,
+        }
+
+    # Bookings don't invalidate the catalog, hence the short TTL.
+    variant = (str(pickup_date), str(return_date), sorted(lookups.items()), sort, per_page, cursor)
+    try:
+        data = caching.get_or_set("available_cars", ["catalog"], variant, build, AVAILABILITY_CACHE_TTL)
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(data)
+
+
+@conditional.conditional(_detail_stamps)
 def detail(request, pk):
-    car = get_object_or_404(Car, pk=pk)
+    car = caching.get_or_set(
+        "detail", ["catalog", "owners"], pk,
+        lambda: get_object_or_404(Car.objects.select_related("owner"), pk=pk),
+    )
     reviews = Review.objects.filter(car=car).select_related("user")
+    paginator = Paginator(reviews, REVIEWS_PAGE_SIZE)
+    paginator.count = car.review_count  # denormalized, saves a COUNT(*)
+    reviews_page = paginator.get_page(request.GET.get("page"))
+    reviews_page.object_list = caching.get_or_set(
+        "detail_reviews", [f"car:{pk}"], (pk, reviews_page.number),
+        lambda: list(reviews_page.object_list),
+    )
     return render(request, "detail.html", {"car": car,
-        "reviews": reviews,})
+        "reviews": reviews_page,
+        "avg_rating": car.rating_avg,
+        "count_reviews": car.review_count,})
+
+
+def car_rendition(request, car_id, rendition, fmt):
+    """Stable URL for a car's image rendition; redirects to the current file."""
+    if rendition not in images.RENDITIONS or fmt not in images.FORMATS:
+        raise Http404
+    car = get_object_or_404(
+        Car.objects.only("image", "image_status", "image_hash", "image_source"), pk=car_id
+    )
+    if not car.image:
+        raise Http404
+    # The placeholder while the upload is still waiting for the worker
+    return redirect(images.rendition_url(car, rendition, fmt))
 
 # def payment_success(request):
 #     messages.success(request, "✅ Payment completed successfully!")
@@ -159,9 +395,21 @@ def owner_dashboard(request):
     if request.user.role != "owner":
         return redirect("index")
 
-    cars = request.user.cars.all()
-    bookings = Booking.objects.filter(car__owner=request.user)
-    return render(request, "owner_dashboard.html", {"cars": cars, "bookings": bookings , "request": request,} )
+    cars = list(request.user.cars.all())
+    bookings = (
+        Booking.objects.filter(car__owner=request.user)
+        .select_related("user", "car")
+    )
+    bookings_page = Paginator(bookings, DASHBOARD_PAGE_SIZE).get_page(request.GET.get("page"))
+
+    return render(request, "owner_dashboard.html", {
+        "cars": cars,
+        "bookings": bookings_page,
+        "request": request,
+        "status_counts": dashboard.bookings_per_status(request.user),
+        "revenue_per_car": dashboard.revenue_per_car(request.user),
+        "utilization": dashboard.utilization_per_month(request.user, len(cars)),
+    })
 
 @login_required(login_url="login")
 def add_car(request):
@@ -200,7 +448,9 @@ def add_car(request):
                 "transmission": car.transmission,
                 "mileage": car.mileage,
                 "price": float(car.price),
-                "image_url": car.image.url if car.image else None
+                # Placeholder until process_car_images has built the renditions
+                "image_url": images.rendition_url(car, "thumb") or None,
+                "image_status": car.image_status,
             })
 
         except Exception as e:
@@ -240,7 +490,8 @@ def edit_car(request):
             'mileage': car.mileage,
             'price': str(car.price),
             'description': car.description,
-            'image_url': car.image.url if car.image else ''
+            'image_url': images.rendition_url(car, 'thumb'),
+            'image_status': car.image_status,
         })
     return JsonResponse({'success': False})
 
@@ -275,8 +526,11 @@ def booking_view(request):
         pickup_date_str = request.POST.get("pickup_date")
         return_date_str = request.POST.get("return_date")
 
-        pickup_date = datetime.strptime(pickup_date_str, "%Y-%m-%d").date()
-        return_date = datetime.strptime(return_date_str, "%Y-%m-%d").date()
+        try:
+            pickup_date = datetime.strptime(pickup_date_str, "%Y-%m-%d").date()
+            return_date = datetime.strptime(return_date_str, "%Y-%m-%d").date()
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "Dates must be YYYY-MM-DD."}, status=400)
         today = date.today()
         if pickup_date < today:
             return JsonResponse({
@@ -286,36 +540,26 @@ def booking_view(request):
         # ✅ NEW: تحقق من ترتيب التواريخ (أن تاريخ الإرجاع بعد الاستلام)
         if return_date < pickup_date:
             return JsonResponse({"status": "error", "message": "Return date must be after pickup date."}, status=400)
+        if pickup_date > availability.LAST_PICKUP_DATE:
+            return JsonResponse({"status": "error", "message": "Pickup date is out of range."}, status=400)
 
-        # ✅ NEW: تحقق من وجود تعارض في الحجوزات
-        from django.db import transaction
-        with transaction.atomic():
-            overlapping = Booking.objects.filter(
-                car=car,
-                status__in=["pending", "approved", "paid"],
-                pickup_date__lt=return_date,
-                return_date__gt=pickup_date,
-            ).exists()
-
-            if overlapping:
-                return JsonResponse({
-                    "status": "error",
-                    "message": "🚫 This car is already booked during the selected dates."
-                }, status=400)
-
-            # إنشاء الحجز
-            Booking.objects.create(
-                user=request.user,
-                car=car,
+        try:
+            availability.reserve(
+                car,
+                request.user,
+                pickup_date=pickup_date,
+                return_date=return_date,
                 pickup_location=request.POST.get("pickup_location"),
                 drop_location=request.POST.get("drop_location"),
-                pickup_date=request.POST.get("pickup_date"),
                 pickup_time=request.POST.get("pickup_time"),
-                # ✅ NEW: أضفنا حقول الإرجاع الجديدة
-                return_date=request.POST.get("return_date"),
                 return_time=request.POST.get("return_time"),
                 special_request=request.POST.get("special_request", ""),
             )
+        except availability.CarUnavailable:
+            return JsonResponse({
+                "status": "error",
+                "message": "🚫 This car is already booked during the selected dates."
+            }, status=400)
 
         messages.success(request, "✅ Booking created successfully.")
 
@@ -326,123 +570,173 @@ def booking_view(request):
 @login_required(login_url="login")
 def approve_booking(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, car__owner=request.user)
-    booking.status = "approved"
-    booking.save()
-
-    send_mail(
-        "✅ Booking Approved",
-        f"Hello {booking.user.username}, your booking for {booking.car.name} has been approved.",
-        "noreply@royalcars.com",
-        [booking.user.email],
-        fail_silently=True,
-    )
+    changed, _ = transitions.transition(Booking.objects.filter(pk=booking.pk), Booking.STATUS_APPROVED)
 
-    messages.success(request, "✅ Booking approved and email sent.")
+    if changed:
+        messages.success(request, "✅ Booking approved and email sent.")
+    else:
+        messages.warning(request, "⚠️ Only pending bookings can be approved.")
     return redirect("owner_dashboard")
 
 
 @login_required(login_url="login")
 def reject_booking(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, car__owner=request.user)
-    booking.status = "rejected"
-    booking.save()
-
-    send_mail(
-        "❌ Booking Rejected",
-        f"Hello {booking.user.username}, your booking for {booking.car.name} has been rejected.",
-        "noreply@royalcars.com",
-        [booking.user.email],
-        fail_silently=True,
-    )
+    changed, _ = transitions.transition(Booking.objects.filter(pk=booking.pk), Booking.STATUS_REJECTED)
 
-    messages.warning(request, "❌ Booking rejected.")
+    if changed:
+        messages.warning(request, "❌ Booking rejected.")
+    else:
+        messages.warning(request, "⚠️ This booking can no longer be rejected.")
     return redirect("owner_dashboard")
 
+
+BULK_ACTIONS = {"approve": Booking.STATUS_APPROVED, "reject": Booking.STATUS_REJECTED}
+BULK_MAX_BOOKINGS = 500
+
+
 @login_required(login_url="login")
-def my_bookings(request):
-    bookings = Booking.objects.filter(user=request.user).select_related("car")
-    today = timezone.now().date()
+@require_POST
+def bulk_booking_action(request):
+    """Approve or reject many of the owner's bookings in one request (owner dashboard)."""
+    status = BULK_ACTIONS.get(request.POST.get("action"))
+    try:
+        ids = {int(pk) for pk in request.POST.getlist("ids")}
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid booking id."}, status=400)
+    if status is None or not ids:
+        return JsonResponse({"status": "error", "message": "Choose an action and at least one booking."}, status=400)
+    if len(ids) > BULK_MAX_BOOKINGS:
+        return JsonResponse(
+            {"status": "error", "message": f"At most {BULK_MAX_BOOKINGS} bookings at a time."}, status=400
+        )
 
-    for b in bookings:
-        b.has_comment = hasattr(b, "review")
+    # Ids that aren't the owner's are reported as skipped, same as wrong-status ones.
+    changed, skipped = transitions.transition(
+        Booking.objects.filter(pk__in=ids, car__owner=request.user), status
+    )
+    skipped = sorted(set(skipped) | (ids - set(changed)))
+    return JsonResponse({"status": "success", "new_status": status, "changed": changed, "skipped": skipped})
 
+
+@login_required(login_url="login")
+def my_bookings(request):
+    try:
+        page = _my_bookings_page(request.user, request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404("Invalid bookings page.")
+    today = timezone.now().date()
+    for b in page:
+        b.can_comment = _can_comment(b, today)
     return render(request, "my_bookings.html", {
-        "bookings": bookings,
+        "bookings": page,
+        "page": page,
         "today": today,
     })
 
+
+@login_required(login_url="login")
+def my_bookings_api(request):
+    """
+    The renter's bookings as JSON, newest first; pass `next_cursor` back as
+    `cursor` to get the next page.
+    """
+    try:
+        page = _my_bookings_page(request.user, request.GET.get("cursor"), _page_size(request, MY_BOOKINGS_PAGE_SIZE))
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    today = timezone.now().date()
+    return JsonResponse({
+        "results": [_booking_to_dict(b, today) for b in page],
+        "next_cursor": page.next_cursor,
+    })
+
+
+def _my_bookings_page(user, cursor=None, per_page=MY_BOOKINGS_PAGE_SIZE):
+    """
+    One page of `user`'s bookings in a single query: car and owner joined
+    in, and whether each one has a review as an EXISTS column.
+    """
+    queryset = (
+        Booking.objects.filter(user=user)
+        .select_related("car", "car__owner")
+        .annotate(has_comment=Exists(Review.objects.filter(booking=OuterRef("pk"))))
+    )
+    return KeysetPaginator(queryset, MY_BOOKINGS_ORDERING, per_page).page(cursor)
+
+
+def _can_comment(booking, today):
+    """Mirrors the check in add_comment."""
+    return booking.status == Booking.STATUS_PAID and booking.return_date < today and not booking.has_comment
+
+
+def _booking_to_dict(booking, today):
+    car = booking.car
+    return {
+        "id": booking.id,
+        "car": {"id": car.id, "name": car.name, "company": contracts.company_name(booking)} if car else None,
+        "pickup_location": booking.pickup_location,
+        "drop_location": booking.drop_location,
+        "pickup_date": booking.pickup_date,
+        "pickup_time": booking.pickup_time,
+        "return_date": booking.return_date,
+        "return_time": booking.return_time,
+        "days": booking.days,
+        "total_price": str(booking.total_price),
+        "status": booking.status,
+        "expires_at": booking.expires_at,
+        "has_comment": booking.has_comment,
+        "can_comment": _can_comment(booking, today),
+        "contract_url": reverse("booking_contract", args=[booking.id]) if booking.contract_file else None,
+    }
+
 @login_required(login_url="login")
 def pay_booking(request, booking_id):
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+    booking = get_object_or_404(Booking.objects.select_related("car"), id=booking_id, user=request.user)
 
     if booking.status != "approved":
         messages.warning(request, "⚠️ You can only pay after the owner approves your booking.")
         return redirect("my_bookings")
-    # مبلغ الدفع (سعر اليوم الواحد) بالسنت
-    amount_cents = int(float(booking.car.price) * 100)
-
-    # جلسة Stripe Checkout
-    session = stripe.checkout.Session.create(
-        mode="payment",
-        payment_method_types=["card"],
-        line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {
-                                "name": f"{booking.car.name} ",
-                                "description": f"🚗 Pickup: {booking.pickup_location} → 🏁 Drop: {booking.drop_location}",
-                                "images": [f"{settings.DOMAIN}{booking.car.image.url}"],
-                            },
-                            "unit_amount": amount_cents,  # بالدولار
-                            
-                        },
-                        "quantity": 1,
-                    }
-                ],
-        metadata={"booking_id": str(booking.id), "user_id": str(request.user.id)},
-        success_url=f"{settings.DOMAIN}/payment/success/?session_id={{CHECKOUT_SESSION_ID}}",
-        cancel_url=f"{settings.DOMAIN}/payment/cancel/?booking={booking.id}",
-    )
+    # جلسة Stripe Checkout بالمبلغ المحسوب عند الحجز (total_price)
+    try:
+        url = payments.checkout(booking)
+    except stripe.StripeError:
+        messages.error(request, "⚠️ The payment service is not responding. Please try again in a moment.")
+        return redirect("my_bookings")
 
-    return HttpResponseRedirect(session.url)
+    return HttpResponseRedirect(url)
 
 
 @login_required(login_url="login")
 def payment_success(request):
+    # Stripe reports the payment to stripe_webhook; this page only reads
+    # what has been recorded so far.
     session_id = request.GET.get("session_id")
+    booking = None
+    if session_id:
+        booking = Booking.objects.filter(user=request.user, stripe_session_id=session_id).first()
 
-    try:
-        session = stripe.checkout.Session.retrieve(session_id)
-        booking_id = session.metadata.get("booking_id")
-    except Exception as e:
-        booking_id = None
-        print("⚠️ Stripe session not found:", e)
-
-    if booking_id:
-        try:
-            booking = Booking.objects.get(id=booking_id, user=request.user)
-
-            # ✅ تحديث حالة الحجز تلقائيًا إلى paid
-            booking.status = "paid"
-            booking.save()
-
-            # ✉️ إرسال رسالة تأكيد بسيطة (اختياري)
-            send_mail(
-                "✅ Payment Successful - Royal Cars",
-                f"Hello {request.user.username},\n\nYour payment for {booking.car.name} was successful! Your booking is now marked as paid.",
-                "noreply@royalcars.com",
-                [request.user.email],
-                fail_silently=True,
-            )
+    if booking is None:
+        messages.error(request, "⚠️ Invalid payment confirmation.")
+        return redirect("my_bookings")
 
-            messages.success(request, "✅ Payment successful! Your booking is now marked as paid.")
-        except Booking.DoesNotExist:
-            messages.error(request, "⚠️ Booking not found.")
+    if booking.status == Booking.STATUS_PAID:
+        messages.success(request, "✅ Payment successful! Your booking is now marked as paid.")
     else:
-        messages.error(request, "⚠️ Invalid payment confirmation.")
+        messages.info(request, "⏳ Payment received. We're confirming it with Stripe; your booking will show as paid shortly.")
 
-    return redirect(f"{reverse('my_bookings')}?show_contract=true&booking={booking_id}")
+    return redirect(f"{reverse('my_bookings')}?show_contract=true&booking={booking.id}")
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    try:
+        event = payments.construct_event(request.body, request.META.get("HTTP_STRIPE_SIGNATURE"))
+    except (ValueError, stripe.SignatureVerificationError):
+        return HttpResponse(status=400)
+    payments.handle_event(event)
+    return HttpResponse(status=200)
 
 @login_required(login_url="login")
 def payment_cancel(request):
@@ -450,9 +744,6 @@ def payment_cancel(request):
     return redirect("profile")
 
 
-stripe.api_key = getattr(settings, "STRIPE_SECRET_KEY", None)
-
-
 @login_required(login_url="login")
 @csrf_exempt
 def create_checkout_session(request):
@@ -460,45 +751,28 @@ def create_checkout_session(request):
         try:
             car = get_object_or_404(Car, pk=request.POST.get("car"))
 
+            pickup_date = datetime.strptime(request.POST.get("pickup_date"), "%Y-%m-%d").date()
+            return_date = datetime.strptime(request.POST.get("return_date"), "%Y-%m-%d").date()
+
             # إنشاء حجز مؤقت
-            booking = Booking.objects.create(
-                user=request.user,
-                car=car,
+            booking = availability.reserve(
+                car,
+                request.user,
+                pickup_date=pickup_date,
+                return_date=return_date,
                 pickup_location=request.POST.get("pickup_location"),
                 drop_location=request.POST.get("drop_location"),
-                pickup_date=request.POST.get("pickup_date"),
                 pickup_time=request.POST.get("pickup_time"),
+                return_time=request.POST.get("return_time"),
                 special_request=request.POST.get("special_request", ""),
             )
 
             # إنشاء جلسة الدفع
-            checkout_session = stripe.checkout.Session.create(
-                mode="payment",
-                payment_method_types=["card"],
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {
-                                "name": f"{booking.car.name} (1 day)",
-                                "description": f"🚗 Pickup: {booking.pickup_location}→ 🏁 Drop: {booking.drop_location}",
-                                "images": [f"{settings.DOMAIN}{booking.car.image.url}"],
-                            },
-                            "unit_amount": int(float(car.price) * 100),  # بالدولار
-                            
-                        },
-                        "quantity": 1,
-                    }
-                ],
-                 metadata={  # ✅ نحفظ البيانات هنا
-                    "booking_id": str(booking.id),
-                    "user_id": str(request.user.id)
-                },
-                success_url=f"{settings.DOMAIN}/payment/success/?session_id={{CHECKOUT_SESSION_ID}}",
-                cancel_url=f"{settings.DOMAIN}/payment/cancel/?booking={booking.id}",
-            )
+            url = payments.checkout(booking)
 
-            return JsonResponse({"url": checkout_session.url})
+            return JsonResponse({"url": url})
+        except availability.CarUnavailable:
+            return JsonResponse({"error": "This car is already booked during the selected dates."}, status=400)
         except Exception as e:
             return JsonResponse({"error": str(e)})
 
@@ -540,108 +814,118 @@ def add_comment(request, booking_id):
 @require_POST
 def approve_contract(request):
     booking_id = request.POST.get("booking_id")
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+    booking = get_object_or_404(
+        Booking.objects.select_related("user", "car__owner"), id=booking_id, user=request.user
+    )
 
-    # تاريخ اليوم
-    today = timezone.now().strftime("%B %d, %Y")
+    # يُنشأ العقد ويُرسل بالبريد مرة واحدة فقط لكل حجز
+    contracts.sign(booking)
 
-    company_name = (
-            booking.car.owner.company_name
-            if booking.car and booking.car.owner and booking.car.owner.company_name
-            else "Royal Cars Company"
-        )
-        # ✉️ نص العقد الكامل داخل البريد
-    contract_text = f"""
-==============================
-   ROYAL CARS RENTAL AGREEMENT
-==============================
-
-Date: {today}
-Company: {company_name}
-Customer: {request.user.get_full_name() or request.user.username}
-Car: {booking.car.name}
-Pickup: {booking.pickup_location}
-Drop: {booking.drop_location}
-Rental Period: {booking.pickup_date} → {booking.return_date}
-Price: ${booking.car.price}
-
-------------------------------------------------------------
-TERMS & CONDITIONS
-------------------------------------------------------------
-1. The renter agrees to operate the vehicle safely and in accordance with all traffic laws.
-2. The renter is responsible for any damages, fines, or traffic violations during the rental period.
-3. No smoking, racing, or illegal activity is permitted in the vehicle.
-4. The vehicle must be returned in the same condition as received.
-5. Fuel costs, tolls, and additional fees are the renter’s responsibility.
-6. Payment has been received in full via Stripe.
-7. Violation of these terms may result in early termination of the agreement.
-
-------------------------------------------------------------
-ACCEPTANCE
-------------------------------------------------------------
-By accepting this agreement electronically through Royal Cars,
-the renter acknowledges full understanding and agreement to all terms above.
-
-Digital Signature: {request.user.get_full_name() or request.user.username}
-Date Signed: {today}
-
-------------------------------------------------------------
-Thank you for choosing {company_name}.
-We look forward to serving you again!
-
-{company_name} Team
-www.royalcars.com
-------------------------------------------------------------
-"""
-
-    # إرسال البريد
-    send_mail(
-        subject=f"✅ Rental Agreement Confirmation - {company_name}",
-        message=contract_text,
-        from_email="noreply@royalcars.com",
-        recipient_list=[request.user.email],
-        fail_silently=True,
+    # The contract modal posts with fetch() and expects JSON
+    if "text/html" not in request.headers.get("Accept", ""):
+        return JsonResponse({"success": True, "contract_url": reverse("booking_contract", args=[booking.id])})
+    return redirect("my_bookings")
+
+
+@login_required(login_url="login")
+def booking_contract(request, booking_id):
+    booking = get_object_or_404(
+        Booking.objects.filter(Q(user=request.user) | Q(car__owner=request.user)), id=booking_id
     )
+    if not booking.contract_file:
+        raise Http404("This booking has no signed agreement yet.")
 
-    return redirect("my_bookings")
+    etag = contracts.etag(booking.contract_file)
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            default_storage.open(booking.contract_file, "rb"),
+            content_type=f"{contracts.CONTENT_TYPE}; charset=utf-8",
+            as_attachment="download" in request.GET,
+            filename=contracts.filename(booking),
+        )
+    # A signed agreement never changes.
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
 # ===========================
 # SEARCH & COMPANIES
 # ===========================
+@conditional.conditional(_catalog_stamps, conditional.API_CACHE_CONTROL)
 def search_cars(request):
-    query = request.GET.get("q", "")
-    cars = Car.objects.filter(
-        Q(name__icontains=query) |
-        Q(transmission__icontains=query) |
-        Q(year__icontains=query)
-    )
-    results = [{
-        "id": car.id,
-        "name": car.name,
-        "year": car.year,
-        "transmission": car.transmission,
-        "mileage": car.mileage,
-        "price": str(car.price),
-        "image": car.image.url if car.image else "",
-    } for car in cars]
-
-    return JsonResponse({"results": results})
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(max(int(request.GET.get("limit", SEARCH_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+        offset = min(max(int(request.GET.get("offset", 0)), 0), SEARCH_MAX_OFFSET)
+    except ValueError:
+        return JsonResponse({"error": "limit and offset must be integers."}, status=400)
+
+    if not query:
+        # Cleared search box: show the first catalog page again.
+        page = _catalog_page(per_page=limit)
+        return JsonResponse({"results": [_car_to_dict(car) for car in page]})
+
+    found = search.search(query, limit=limit, offset=offset)
+    return JsonResponse({
+        "results": [_car_to_dict(car) for car in found.cars],
+        "total": found.total,
+        "facets": found.facets,
+    })
 
 
 def companies_list(request):
-    owners = User.objects.filter(role="owner", is_approved=True)
-    return render(request, "companies.html", {"owners": owners})
+    sort = request.GET.get("sort") if request.GET.get("sort") in COMPANIES_SORTS else "name"
+    try:
+        page = caching.get_or_set(
+            "companies", ["owners", "catalog"], _params(request),
+            lambda: _companies_page(sort, request.GET.get("cursor")), COMPANIES_CACHE_TTL,
+        )
+    except InvalidCursor:
+        raise Http404("Invalid companies page.")
+    return render(request, "companies.html", {
+        "owners": page,
+        "page": page,
+        "sort": sort,
+        "sorts": list(COMPANIES_SORTS),
+        "query": _query_without_cursor(request),
+    })
+
 
+def _storefront_stamps(request, owner_id):
+    """
+    The owner's summary row, which every save of the owner's account
+    touches (see owners.sync_summary), and the owner's cars: every car edit
+    moves the newest updated_at and every delete the count. One aggregate
+    over the summary's primary key joined to the cars' owner index.
+    """
+    summary = OwnerSummary.objects.filter(owner_id=owner_id).aggregate(
+        owner_updated=Max("updated_at"),
+        cars_updated=Max("owner__cars__updated_at"),
+        car_count=Count("owner__cars"),
+    )
+    return summary["owner_updated"], summary["cars_updated"], summary["car_count"]
 
-def owner_cars(request, owner_id):
-    owner = get_object_or_404(User, id=owner_id, role="owner")
-    cars = Car.objects.filter(owner=owner)
-    return render(request, "owner_cars.html", {"owner": owner, "cars": cars})
 
+@conditional.conditional(_storefront_stamps)
+def owner_storefront(request, owner_id):
+    """
+    An owner's details and a keyset page of their cars, cached per owner
+    and keyed by the fleet's stamps (read once, by the conditional
+    decorator), so it is rebuilt only after one of the owner's cars changes.
+    """
+    cursor = request.GET.get("cursor")
 
-def owner_profile(request, owner_id):
-    owner = get_object_or_404(User, id=owner_id, role="owner")
-    cars = Car.objects.filter(owner=owner)
-    return render(request, "owner_cars.html", {"owner": owner, "cars": cars})
+    def build():
+        owner = get_object_or_404(User, id=owner_id, role="owner")
+        return owner, _catalog_page(cursor, STOREFRONT_PAGE_SIZE, Car.objects.filter(owner=owner))
+
+    variant = (owner_id, cursor, request.stamps or _storefront_stamps(request, owner_id))
+    try:
+        owner, page = caching.get_or_set("owner_storefront", [f"owner:{owner_id}"], variant, build)
+    except InvalidCursor:
+        raise Http404("Invalid storefront page.")
+    return render(request, "owner_cars.html", {"owner": owner, "cars": page, "page": page})
 
 
 # ===========================
@@ -662,12 +946,23 @@ def contact(request):
         full_subject = f"[Royal Cars Contact] {subject}"
         full_message = f"From: {name} <{email}>\n\nMessage:\n{message}"
 
-        try:
-            send_mail(full_subject, full_message, settings.DEFAULT_FROM_EMAIL, [to_email])
-            messages.success(request, "✅ Your message has been sent successfully.")
-        except Exception as e:
-            messages.error(request, f"❌ Failed to send message: {e}")
+        outbox.enqueue(full_subject, full_message, [to_email], settings.DEFAULT_FROM_EMAIL)
+        messages.success(request, "✅ Your message has been sent successfully.")
 
         return redirect("contact")
 
-    return render(request, "contact.html", {"CONTACT_EMAIL": getattr(settings, "CONTACT_EMAIL", None)})
\ No newline at end of file
+    return render(request, "contact.html", {"CONTACT_EMAIL": getattr(settings, "CONTACT_EMAIL", None)})
+
+# ===========================
+# MONITORING
+# ===========================
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss counts and hit ratio of the view caches (see core/caching.py)."""
+    return JsonResponse(caching.stats(CACHED_VIEWS))
+
+
+@staff_member_required
+def metrics_view(request):
+    """Rolling request histograms in Prometheus text format (see core/metrics.py)."""
+    return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4")
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -154,4 +155,19 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
-DOMAIN = os.getenv("DOMAIN", "http://127.0.0.1:8000")
\ No newline at end of file
+# Signing secret of the /payment/webhook/ endpoint (whsec_...)
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# core.payments.StripeGateway, or core.payments.FakeGateway to work offline
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "core.payments.StripeGateway")
+DOMAIN = os.getenv("DOMAIN", "http://127.0.0.1:8000")
+
+# Page/data cache (see core/caching.py). Per-process memory by default; point
+# CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached to share it between
+# workers, e.g. django.core.cache.backends.redis.RedisCache + redis://host:6379.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "royal-cars"),
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", "300")),
+    }
+}